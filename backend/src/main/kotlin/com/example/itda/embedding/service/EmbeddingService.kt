@@ -3,13 +3,21 @@ package com.example.itda.embedding.service
 import com.example.itda.embedding.controller.EmbeddingRequest
 import com.example.itda.embedding.controller.EmbeddingResponse
 import com.example.itda.embedding.controller.EmbeddingStatusResponse
+import com.example.itda.program.EmbeddingException
+import com.fasterxml.jackson.databind.ObjectMapper
+import com.fasterxml.jackson.module.kotlin.readValue
+import org.springframework.http.MediaType
 import org.springframework.stereotype.Service
 import org.springframework.web.reactive.function.client.WebClient
 import org.springframework.web.reactive.function.client.bodyToMono
+import org.springframework.web.reactive.function.client.toEntity
+import java.nio.ByteBuffer
+import java.nio.ByteOrder
 
 @Service
 class EmbeddingService(
     private val embeddingWebClient: WebClient,
+    private val objectMapper: ObjectMapper,
 ) {
     fun checkServerHealth(): EmbeddingStatusResponse? {
         return embeddingWebClient.get()
@@ -30,8 +38,32 @@ class EmbeddingService(
 
     fun getEmbedding(text: String): FloatArray? {
         val request = EmbeddingRequest(text)
-        val response = getEmbedding(request)
 
-        return response?.embedding?.toFloatArray()
+        // raw little-endian float32 instead of a JSON list of 1024 numbers
+        val response =
+            embeddingWebClient.post()
+                .uri("/v1/embed")
+                .accept(MediaType.APPLICATION_OCTET_STREAM)
+                .bodyValue(request)
+                .retrieve()
+                .toEntity<ByteArray>()
+                .block() ?: return null
+        val bytes = response.body ?: return null
+        val headers = response.headers
+
+        // a server that predates the binary format ignores Accept and sends JSON
+        if (headers.contentType?.isCompatibleWith(MediaType.APPLICATION_OCTET_STREAM) != true) {
+            return objectMapper.readValue<EmbeddingResponse>(bytes).embedding.toFloatArray()
+        }
+
+        val count = headers.getFirst("X-Embedding-Count")?.toIntOrNull()
+        val dim = headers.getFirst("X-Embedding-Dim")?.toIntOrNull()
+        val dtype = headers.getFirst("X-Embedding-Dtype")
+        if (count != 1 || dim == null || dtype != "float32" || bytes.size != dim * Float.SIZE_BYTES) {
+            throw EmbeddingException()
+        }
+
+        val buffer = ByteBuffer.wrap(bytes).order(ByteOrder.LITTLE_ENDIAN).asFloatBuffer()
+        return FloatArray(buffer.remaining()).also { buffer.get(it) }
     }
 }
@@ -0,0 +1,99 @@
+"""Compares fixed file-order batching with length-bucketed batching.
+
+    python bench/vectorize_batching.py --limit 2000
+    python bench/vectorize_batching.py --max-tokens 4096,8192,16384
+
+Reads trimmed programs (data/trimmed_programs.jsonl by default), encodes
+them once per strategy and reports throughput, padding efficiency (real
+tokens / padded tokens) and the largest difference from fixed batching.
+"""
+
+import argparse
+import json
+import sys
+import time
+from itertools import islice
+from pathlib import Path
+
+import numpy as np
+
+PIPELINE_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(PIPELINE_DIR / "src"))
+
+from vectorizer import Vectorizer  # noqa: E402
+from vectorizer.vectorizer import generate_program_text, plan_batches  # noqa: E402
+
+
+def padding_efficiency(lengths, batches) -> float:
+    real = sum(lengths)
+    padded = sum(len(batch) * max(lengths[i] for i in batch) for batch in batches)
+    return real / padded
+
+
+def encode_fixed(vectorizer, texts, batch_size):
+    vectors = []
+    for start in range(0, len(texts), batch_size):
+        vectors.append(
+            vectorizer.model.encode(
+                texts[start : start + batch_size],
+                batch_size=batch_size,
+                normalize_embeddings=True,
+                show_progress_bar=False,
+            )
+        )
+    return np.concatenate(vectors)
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--input", type=Path, default=PIPELINE_DIR / "data" / "trimmed_programs.jsonl"
+    )
+    parser.add_argument("--limit", type=int, default=1000)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--max-tokens", type=str, default="8192")
+    parser.add_argument("--backend", type=str, default="torch")
+    args = parser.parse_args()
+
+    with args.input.open("r", encoding="utf-8") as f:
+        programs = [json.loads(line) for line in islice(f, args.limit)]
+    texts = [generate_program_text(program) for program in programs]
+
+    vectorizer = Vectorizer(backend=args.backend, batch_size=args.batch_size)
+    lengths = vectorizer.token_lengths(texts)
+    print(f"{len(texts)} texts, {sum(lengths) / len(lengths):.0f} tokens on average")
+
+    # warm up so the first strategy does not pay for lazy initialisation
+    vectorizer.model.encode(texts[: args.batch_size], show_progress_bar=False)
+
+    fixed_batches = [
+        list(range(start, min(start + args.batch_size, len(texts))))
+        for start in range(0, len(texts), args.batch_size)
+    ]
+    baseline, seconds = timed(lambda: encode_fixed(vectorizer, texts, args.batch_size))
+    print(
+        f"fixed      batch={args.batch_size:<5} "
+        f"{len(texts) / seconds:8.1f} texts/s  "
+        f"padding efficiency {padding_efficiency(lengths, fixed_batches):.2f}"
+    )
+
+    for max_tokens in [int(value) for value in args.max_tokens.split(",")]:
+        vectorizer.max_tokens = max_tokens
+        batches = plan_batches(lengths, args.batch_size, max_tokens)
+        vectors, seconds = timed(lambda: vectorizer.encode(texts))
+        print(
+            f"bucketed   tokens={max_tokens:<5} "
+            f"{len(texts) / seconds:8.1f} texts/s  "
+            f"padding efficiency {padding_efficiency(lengths, batches):.2f}  "
+            f"max diff {float(np.abs(vectors - baseline).max()):.2e}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""Compares single-process and multi-process vectorization on CPU.
+
+    python bench/vectorize_workers.py --configs 1x8,2x4,4x2,8x1 --limit 2000
+
+Each config is WORKERSxTHREADS: 1xT encodes in this process with T torch
+threads, Wx T shards every window over W worker processes with T threads
+each. Model loading and warm-up are excluded from the timings.
+"""
+
+import argparse
+import json
+import sys
+import time
+from itertools import islice
+from pathlib import Path
+
+import numpy as np
+import torch
+
+PIPELINE_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(PIPELINE_DIR / "src"))
+
+from vectorizer import PooledVectorizer, Vectorizer  # noqa: E402
+
+
+def parse_config(value: str):
+    workers, threads = value.lower().split("x")
+    return int(workers), int(threads)
+
+
+def create(workers: int, threads: int, args):
+    options = {"backend": args.backend, "batch_size": args.batch_size}
+
+    if workers == 1:
+        torch.set_num_threads(threads)
+        return Vectorizer(**options)
+    return PooledVectorizer(workers=workers, threads=threads, **options)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--input", type=Path, default=PIPELINE_DIR / "data" / "trimmed_programs.jsonl"
+    )
+    parser.add_argument("--limit", type=int, default=1000)
+    parser.add_argument("--window", type=int, default=1024)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--configs", type=str, default="1x8,2x4,4x2,8x1")
+    parser.add_argument("--backend", type=str, default="torch")
+    args = parser.parse_args()
+
+    with args.input.open("r", encoding="utf-8") as f:
+        programs = [json.loads(line) for line in islice(f, args.limit)]
+    print(f"{len(programs)} programs, window {args.window}")
+
+    baseline = None
+    for workers, threads in map(parse_config, args.configs.split(",")):
+        vectorizer = create(workers, threads, args)
+        vectorizer.run(programs[: args.batch_size * workers])
+
+        start = time.perf_counter()
+        vectors = np.concatenate(
+            [
+                vectorizer.run(programs[i : i + args.window])
+                for i in range(0, len(programs), args.window)
+            ]
+        )
+        seconds = time.perf_counter() - start
+        vectorizer.close()
+
+        if baseline is None:
+            baseline = vectors
+        print(
+            f"{workers:>2} workers x {threads:>2} threads  "
+            f"{len(programs) / seconds:8.1f} programs/s  "
+            f"max diff {float(np.abs(vectors - baseline).max()):.2e}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,7 @@
+-- Columns used by `--db-save-mode sync`: per-program content and embedding
+-- hashes to skip unchanged rows, and a soft-delete marker for
+-- `--db-sync-delete`. Safe to apply more than once.
+ALTER TABLE program_pending
+    ADD COLUMN IF NOT EXISTS content_hash TEXT,
+    ADD COLUMN IF NOT EXISTS embedding_hash TEXT,
+    ADD COLUMN IF NOT EXISTS deleted_at TIMESTAMPTZ;
@@ -0,0 +1 @@
+from .ivf import IVFIndex, recall_report
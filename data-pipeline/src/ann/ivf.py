@@ -0,0 +1,208 @@
+import json
+import time
+
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import numpy.typing as NDArray
+
+# assignment is done in chunks so the score matrix stays small
+_CHUNK = 4096
+
+
+def _normalize(vectors: NDArray) -> NDArray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def _assign(vectors: NDArray, centroids: NDArray) -> NDArray:
+    labels = np.empty(len(vectors), dtype=np.int64)
+    for start in range(0, len(vectors), _CHUNK):
+        scores = vectors[start : start + _CHUNK] @ centroids.T
+        labels[start : start + _CHUNK] = scores.argmax(axis=1)
+    return labels
+
+
+def train_centroids(
+    vectors: NDArray, n_lists: int, iterations: int = 20, seed: int = 0
+) -> NDArray:
+    """Spherical k-means, since embeddings are compared by inner product."""
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), n_lists, replace=False)].copy()
+
+    for _ in range(iterations):
+        labels = _assign(vectors, centroids)
+
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, vectors)
+        counts = np.bincount(labels, minlength=n_lists)
+
+        # reseed empty lists from random points rather than dropping them
+        empty = counts == 0
+        if empty.any():
+            sums[empty] = vectors[rng.choice(len(vectors), int(empty.sum()))]
+
+        centroids = _normalize(sums)
+
+    return centroids
+
+
+class IVFIndex:
+    """Inverted-file index over unit vectors, searched by inner product.
+
+    Vectors are grouped into ``n_lists`` clusters and stored contiguously
+    per cluster; a query only scans the ``n_probe`` clusters whose
+    centroids are closest, so search cost grows with the list size instead
+    of the whole catalogue.
+    """
+
+    def __init__(
+        self,
+        centroids: NDArray,
+        offsets: NDArray,
+        rows: NDArray,
+        vectors: NDArray,
+        uuids: List[str],
+    ) -> None:
+        self.centroids = centroids
+        self.offsets = offsets
+        self.rows = rows
+        self.vectors = vectors
+        self.uuids = uuids
+
+    @property
+    def n_lists(self) -> int:
+        return len(self.centroids)
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    @classmethod
+    def build(
+        cls,
+        vectors: NDArray,
+        uuids: List[str],
+        n_lists: Optional[int] = None,
+        iterations: int = 20,
+        max_train_per_list: int = 256,
+        seed: int = 0,
+    ) -> "IVFIndex":
+        vectors = _normalize(np.asarray(vectors, dtype=np.float32))
+        n_lists = min(n_lists or max(1, round(np.sqrt(len(vectors)))), len(vectors))
+
+        rng = np.random.default_rng(seed)
+        train_size = min(len(vectors), n_lists * max_train_per_list)
+        sample = vectors[rng.choice(len(vectors), train_size, replace=False)]
+        centroids = train_centroids(sample, n_lists, iterations, seed)
+
+        labels = _assign(vectors, centroids)
+        rows = np.argsort(labels, kind="stable")
+        counts = np.bincount(labels, minlength=n_lists)
+        offsets = np.concatenate([[0], np.cumsum(counts)])
+
+        return cls(centroids, offsets, rows, vectors[rows], uuids)
+
+    def search(
+        self,
+        query: NDArray,
+        k: int = 10,
+        n_probe: int = 8,
+        mask: Optional[NDArray] = None,
+    ) -> Tuple[NDArray, NDArray]:
+        """Returns the rows (in the source matrix) and scores of the top-k.
+
+        ``mask`` is an optional boolean array over source rows; rows where it
+        is False are never returned.
+        """
+        query = np.asarray(query, dtype=np.float32)
+        n_probe = min(n_probe, self.n_lists)
+
+        centroid_scores = self.centroids @ query
+        probe = np.argpartition(-centroid_scores, n_probe - 1)[:n_probe]
+
+        positions = np.concatenate(
+            [np.arange(self.offsets[i], self.offsets[i + 1]) for i in probe]
+        )
+        if mask is not None:
+            positions = positions[mask[self.rows[positions]]]
+        if len(positions) == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        scores = self.vectors[positions] @ query
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+
+        return self.rows[positions[top]], scores[top]
+
+    def save(self, path: Path, meta: Optional[Dict[str, Any]] = None) -> None:
+        path.mkdir(parents=True, exist_ok=True)
+
+        np.save(path / "centroids.npy", self.centroids)
+        np.save(path / "offsets.npy", self.offsets)
+        np.save(path / "rows.npy", self.rows)
+        np.save(path / "vectors.npy", self.vectors)
+
+        with (path / "uuids.json").open("w", encoding="utf-8") as f:
+            json.dump(self.uuids, f)
+
+        meta = {"n_lists": self.n_lists, "count": len(self), **(meta or {})}
+        with (path / "meta.json").open("w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False, indent=2)
+
+    @classmethod
+    def load(cls, path: Path, mmap: bool = True) -> "IVFIndex":
+        mmap_mode = "r" if mmap else None
+
+        with (path / "uuids.json").open("r", encoding="utf-8") as f:
+            uuids = json.load(f)
+
+        return cls(
+            centroids=np.load(path / "centroids.npy"),
+            offsets=np.load(path / "offsets.npy"),
+            rows=np.load(path / "rows.npy"),
+            vectors=np.load(path / "vectors.npy", mmap_mode=mmap_mode),
+            uuids=uuids,
+        )
+
+
+def recall_report(
+    index: IVFIndex,
+    vectors: NDArray,
+    k: int = 10,
+    n_probes: Tuple[int, ...] = (1, 2, 4, 8, 16, 32),
+    queries: int = 200,
+    seed: int = 0,
+) -> Dict[str, Any]:
+    """Recall@k and latency of IVF search against exact brute force.
+
+    Queries are sampled from the indexed vectors themselves.
+    """
+    vectors = _normalize(np.asarray(vectors, dtype=np.float32))
+    rng = np.random.default_rng(seed)
+    sample = vectors[
+        rng.choice(len(vectors), min(queries, len(vectors)), replace=False)
+    ]
+    k = min(k, len(vectors))
+
+    start = time.perf_counter()
+    exact = []
+    for query in sample:
+        scores = vectors @ query
+        exact.append(set(np.argpartition(-scores, k - 1)[:k].tolist()))
+    brute_ms = (time.perf_counter() - start) * 1000 / len(sample)
+
+    report = {"k": k, "queries": len(sample), "brute_force_ms": round(brute_ms, 3)}
+    for n_probe in sorted({min(n, index.n_lists) for n in n_probes}):
+        start = time.perf_counter()
+        found = [set(index.search(query, k, n_probe)[0].tolist()) for query in sample]
+        ivf_ms = (time.perf_counter() - start) * 1000 / len(sample)
+
+        recall = np.mean([len(f & e) / k for f, e in zip(found, exact)])
+        report[f"n_probe={n_probe}"] = {
+            "recall": round(float(recall), 4),
+            "ms": round(ivf_ms, 3),
+        }
+
+    return report
@@ -0,0 +1,2 @@
+from .manager import PostgresManager
+from .vector import Vector
@@ -0,0 +1,47 @@
+import json
+import threading
+from pathlib import Path
+from typing import Any, Dict, Optional, Set, TextIO
+
+from utils.metrics import metrics
+
+from .vector import Vector
+
+
+def _to_json(value: Any) -> Any:
+    if isinstance(value, Vector):
+        return value.tolist()
+    return str(value)
+
+
+class FailureLog:
+    """Appends programs that could not be saved, each with the reason.
+
+    The file is opened once, on the first failure, and written through one
+    buffer shared by every saving thread.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.lock = threading.Lock()
+        self.file: Optional[TextIO] = None
+        self.count = 0
+        self.uuids: Set[str] = set()
+
+    def write(self, program: Dict[str, Any], reason: str) -> None:
+        record = {"error": reason, "program": program}
+        json_string = json.dumps(record, ensure_ascii=False, default=_to_json) + "\n"
+
+        with self.lock:
+            if self.file is None:
+                self.file = self.path.open("a", encoding="utf-8")
+            self.file.write(json_string)
+            self.count += 1
+            self.uuids.add(program.get("uuid"))
+        metrics.inc("db_failed_programs_total")
+
+    def close(self) -> None:
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
@@ -1,9 +1,74 @@
+import hashlib
 import json
+import threading
+from collections import Counter
+from datetime import date, datetime, tzinfo
 from pathlib import Path
-from typing import Any, Dict, List
+from typing import Any, Callable, Dict, List, Tuple
+from zoneinfo import ZoneInfo
+
+from psycopg import Connection, DataError, IntegrityError, ProgrammingError
 from psycopg.rows import dict_row
 from psycopg_pool import ConnectionPool
 
+from utils.metrics import metrics
+
+from .failures import FailureLog
+from .vector import Vector, register_vector
+
+PROGRAM_COLUMNS = [
+    "uuid",
+    "title",
+    "preview",
+    "summary",
+    "details",
+    "application_method",
+    "apply_url",
+    "reference_url",
+    "eligibility_gender",
+    "eligibility_min_age",
+    "eligibility_max_age",
+    "eligibility_region",
+    "eligibility_marital_status",
+    "eligibility_education",
+    "eligibility_min_household",
+    "eligibility_max_household",
+    "eligibility_min_income",
+    "eligibility_max_income",
+    "eligibility_employment",
+    "operating_entity",
+    "operating_entity_type",
+    "apply_start_at",
+    "apply_end_at",
+    "embedding",
+    "category",
+]
+
+INTEGER_TYPES = {"smallint", "integer", "bigint"}
+TEXT_TYPES = {"text", "character varying", "character"}
+
+SYNC_COLUMNS = ["content_hash", "embedding_hash"]
+
+
+def program_hash(program: Dict[str, Any]) -> str:
+    """Hash of every stored column except the embedding, which has its own."""
+    content = {
+        column: program.get(column)
+        for column in PROGRAM_COLUMNS
+        if column != "embedding"
+    }
+    canonical = json.dumps(content, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def is_row_error(error: BaseException) -> bool:
+    """Whether ``error`` is caused by the rows rather than the connection."""
+    if isinstance(error, (DataError, IntegrityError)):
+        return True
+    # raised by psycopg itself while binding parameters, e.g. "cannot adapt
+    # type"; server-side ProgrammingErrors carry a SQLSTATE
+    return isinstance(error, ProgrammingError) and error.sqlstate is None
+
 
 class PostgresManager:
     def __init__(
@@ -13,11 +78,16 @@ class PostgresManager:
         min_pool_size: int = 1,
         max_pool_size: int = 4,
     ) -> None:
+        # set before the pool exists: it configures connections in the background
+        self.column_types: Dict[str, Tuple[int, str]] = {}
+        self.timezone: tzinfo = ZoneInfo("UTC")
+
         self.pool = ConnectionPool(
             conninfo=conn_string,
             min_size=min_pool_size,
             max_size=max_pool_size,
             kwargs={"row_factory": dict_row},
+            configure=self._configure,
         )
 
         self.insert_sql = """
@@ -42,31 +112,360 @@ class PostgresManager:
             ON CONFLICT (uuid) DO NOTHING
         """
 
-        self.failure_path = failure_path
+        columns = ", ".join(PROGRAM_COLUMNS)
+
+        # CREATE TABLE AS keeps the column types but not the NOT NULL/identity
+        # constraints, so bad rows surface in the merge instead of in COPY
+        self.staging_sql = f"""
+            CREATE TEMP TABLE IF NOT EXISTS program_staging
+            ON COMMIT DELETE ROWS
+            AS SELECT {columns} FROM program_pending WITH NO DATA
+        """
+        self.copy_sql = f"COPY program_staging ({columns}) FROM STDIN (FORMAT BINARY)"
+        self.merge_sql = f"""
+            INSERT INTO program_pending ({columns})
+            SELECT {columns} FROM program_staging
+            ON CONFLICT (uuid) DO NOTHING
+        """
+
+        sync_columns = ", ".join(PROGRAM_COLUMNS + SYNC_COLUMNS)
+        updated_columns = ",\n                ".join(
+            f"{column} = s.{column}"
+            for column in PROGRAM_COLUMNS + SYNC_COLUMNS
+            if column not in ("uuid", "embedding")
+        )
+
+        self.sync_lookup_sql = """
+            SELECT uuid, content_hash, embedding_hash, deleted_at
+            FROM program_pending
+            WHERE uuid = ANY(%s)
+        """
+        self.sync_staging_sql = f"""
+            CREATE TEMP TABLE IF NOT EXISTS program_sync_staging
+            ON COMMIT DELETE ROWS
+            AS SELECT {sync_columns} FROM program_pending WITH NO DATA
+        """
+        self.sync_copy_sql = (
+            f"COPY program_sync_staging ({sync_columns}) FROM STDIN (FORMAT BINARY)"
+        )
+        # a NULL staged embedding means the embedding text did not change
+        self.sync_update_sql = f"""
+            UPDATE program_pending p SET
+                {updated_columns},
+                embedding = COALESCE(s.embedding, p.embedding),
+                deleted_at = NULL
+            FROM program_sync_staging s
+            WHERE p.uuid = s.uuid
+        """
+        # existing rows may be staged without an embedding, so they are
+        # filtered out before the NOT NULL check rather than by ON CONFLICT
+        self.sync_insert_sql = f"""
+            INSERT INTO program_pending ({sync_columns})
+            SELECT {sync_columns} FROM program_sync_staging s
+            WHERE NOT EXISTS (
+                SELECT 1 FROM program_pending p WHERE p.uuid = s.uuid
+            )
+            ON CONFLICT (uuid) DO NOTHING
+        """
+        self.soft_delete_sql = """
+            UPDATE program_pending SET deleted_at = now()
+            WHERE deleted_at IS NULL AND NOT (uuid = ANY(%s))
+        """
+
+        self.failures = FailureLog(failure_path)
+        self.stats_lock = threading.Lock()
+        self.sync_stats = {"inserted": 0, "updated": 0, "unchanged": 0}
+
+    def _configure(self, conn: Connection) -> None:
+        register_vector(conn)
+
+        with conn.cursor() as cur:
+            if not self.column_types:
+                cur.execute(
+                    """
+                    SELECT attname, atttypid, format_type(atttypid, atttypmod) AS type_name
+                    FROM pg_attribute
+                    WHERE attrelid = 'program_pending'::regclass
+                      AND attnum > 0 AND NOT attisdropped
+                    """
+                )
+                self.column_types = {
+                    row["attname"]: (row["atttypid"], row["type_name"])
+                    for row in cur.fetchall()
+                }
+
+            # naive timestamps get the zone Postgres would have applied to them
+            cur.execute("SHOW TimeZone")
+            try:
+                self.timezone = ZoneInfo(cur.fetchone()["TimeZone"])
+            except (KeyError, ValueError):
+                self.timezone = ZoneInfo("UTC")
+
+        conn.commit()
+
+    @property
+    def failure_count(self) -> int:
+        return self.failures.count
+
+    def _save_isolated(
+        self,
+        conn: Connection,
+        items: List[Any],
+        save: Callable[[Any, List[Any]], Counter],
+        program_of: Callable[[Any], Dict[str, Any]] = lambda item: item,
+    ) -> Counter:
+        """Runs ``save`` over ``items`` in a savepoint, bisecting on failure.
+
+        A failed statement only rolls back its own savepoint, so a batch
+        with k bad rows costs O(k log n) statements and every good row is
+        still saved by the surrounding transaction. Only row errors (see
+        is_row_error) are bisected; connection and transaction errors would
+        fail every half again, so they propagate.
+        """
+        try:
+            with conn.transaction(), conn.cursor() as cur:
+                return save(cur, items)
+        except Exception as e:
+            if not is_row_error(e):
+                raise
+
+            metrics.inc("db_savepoint_rollbacks_total")
+            if len(items) == 1:
+                program = program_of(items[0])
+                print(f"[!] Failed to save {program.get('uuid')}: {e}")
+                self.failures.write(program, f"{type(e).__name__}: {e}")
+                return Counter()
+
+        middle = len(items) // 2
+        return self._save_isolated(
+            conn, items[:middle], save, program_of
+        ) + self._save_isolated(conn, items[middle:], save, program_of)
+
+    def _coerce(self, column: str, value: Any) -> Any:
+        if value is None:
+            return None
+
+        _, type_name = self.column_types[column]
+
+        if type_name in INTEGER_TYPES:
+            number = int(value)
+            # int() truncates, which would silently turn 3.7 into 3
+            if not isinstance(value, str) and number != value:
+                raise ValueError(f"{column} must be a whole number, got {value!r}")
+            return number
+
+        if type_name.startswith("timestamp") or type_name == "date":
+            if isinstance(value, str):
+                value = datetime.fromisoformat(value)
+            if type_name == "date":
+                return value.date() if isinstance(value, datetime) else value
+            if isinstance(value, date) and not isinstance(value, datetime):
+                value = datetime(value.year, value.month, value.day)
+            if "with time zone" in type_name and value.tzinfo is None:
+                value = value.replace(tzinfo=self.timezone)
+            return value
+
+        if type_name.startswith("vector"):
+            return value if isinstance(value, Vector) else Vector(value)
+
+        if type_name.split("(")[0] in TEXT_TYPES and not isinstance(value, str):
+            raise TypeError(f"{column} must be a string, got {type(value).__name__}")
+
+        return value
 
     def save_programs(self, programs: List[Dict[str, Any]]) -> int:
         if not programs:
             return 0
 
-        inserted_count = 0
-        with self.pool.connection() as conn:
+        # each call checks out its own connection and commits its own batch,
+        # so several threads can save batches concurrently
+        timer = metrics.timer("db_batch_seconds", mode="row")
+        with timer, self.pool.connection() as conn, conn.transaction():
+            counts = self._save_isolated(conn, programs, self._insert)
+
+        return counts["inserted"]
+
+    def _insert(self, cur, programs: List[Dict[str, Any]]) -> Counter:
+        # a missing key becomes NULL, so the row fails its constraints on its
+        # own instead of the whole statement failing to bind
+        rows = [
+            {column: program.get(column) for column in PROGRAM_COLUMNS}
+            for program in programs
+        ]
+        cur.executemany(self.insert_sql, rows)
+        return Counter(inserted=cur.rowcount)
+
+    def save_programs_bulk(self, programs: List[Dict[str, Any]]) -> int:
+        """Loads a batch with one binary COPY into a staging table and one merge.
+
+        Rows that cannot be converted to the column types are recorded as
+        failures up front. If COPY or the merge still fails, the batch is
+        retried through save_programs, which isolates the bad rows.
+        """
+        if not programs:
+            return 0
+
+        timer = metrics.timer("db_batch_seconds", mode="bulk")
+        with timer, self.pool.connection() as conn:
+            # column types are read when the pool configures a connection
+            rows, valid_programs = self._coerce_programs(programs)
+            if not rows:
+                return 0
+
+            try:
+                with conn.cursor() as cur:
+                    cur.execute(self.staging_sql)
+
+                    with cur.copy(self.copy_sql) as copy:
+                        copy.set_types(
+                            [self.column_types[column][0] for column in PROGRAM_COLUMNS]
+                        )
+                        for row in rows:
+                            copy.write_row(row)
+
+                    cur.execute(self.merge_sql)
+                    inserted_count = cur.rowcount
+
+                conn.commit()
+                return inserted_count
+            except Exception as e:
+                conn.rollback()
+                print(f"[!] Bulk save failed, retrying row by row: {e}")
+
+        return self.save_programs(valid_programs)
+
+    def check_sync_schema(self) -> None:
+        """Fails fast unless the columns sync mode relies on exist.
+
+        They are added by migrations/001_program_pending_sync.sql.
+        """
+        # column_types is read when the first connection is configured
+        with self.pool.connection():
+            pass
+
+        missing = [
+            column
+            for column in SYNC_COLUMNS + ["deleted_at"]
+            if column not in self.column_types
+        ]
+        if missing:
+            raise RuntimeError(
+                f"program_pending is missing sync columns {', '.join(missing)}; "
+                "apply migrations/001_program_pending_sync.sql first."
+            )
+
+    def save_programs_sync(self, programs: List[Dict[str, Any]]) -> int:
+        """Brings the rows of a batch in line with ``programs``.
+
+        Stored hashes for the whole batch are fetched in one query. New rows
+        are inserted, rows whose content hash changed are updated, and the
+        rest are left alone. The embedding is only sent when the program's
+        ``embedding_hash`` differs from the stored one.
+        """
+        if not programs:
+            return 0
+
+        embedding_index = PROGRAM_COLUMNS.index("embedding")
+
+        timer = metrics.timer("db_batch_seconds", mode="sync")
+        with timer, self.pool.connection() as conn, conn.transaction():
+            rows, valid_programs = self._coerce_programs(programs)
+            if not rows:
+                return 0
+
             with conn.cursor() as cur:
-                for program in programs:
-                    try:
-                        cur.execute(self.insert_sql, program)
-                        inserted_count += cur.rowcount
-                    except Exception as e:
-                        print(e)
-                        with self.failure_path.open("a", encoding="utf-8") as f_out:
-                            json_string = json.dumps(program, ensure_ascii=False) + "\n"
-                            f_out.write(json_string)
+                uuids = [program["uuid"] for program in valid_programs]
+                cur.execute(self.sync_lookup_sql, (uuids,))
+                stored = {row["uuid"]: row for row in cur.fetchall()}
+
+            staged = []
+            for row, program in zip(rows, valid_programs):
+                content_hash = program_hash(program)
+                embedding_hash = program.get("embedding_hash")
+                old = stored.get(program["uuid"])
+
+                same_embedding = (
+                    old is not None
+                    and embedding_hash is not None
+                    and old["embedding_hash"] == embedding_hash
+                )
+                if (
+                    same_embedding
+                    and old["content_hash"] == content_hash
+                    and old["deleted_at"] is None
+                ):
+                    continue
+
+                if same_embedding:
+                    row = list(row)
+                    row[embedding_index] = None
+                staged.append((row + [content_hash, embedding_hash], program))
+
+            counts = Counter()
+            if staged:
+                counts = self._save_isolated(
+                    conn, staged, self._sync_staged, program_of=lambda item: item[1]
+                )
+
+        with self.stats_lock:
+            self.sync_stats["inserted"] += counts["inserted"]
+            self.sync_stats["updated"] += counts["updated"]
+            self.sync_stats["unchanged"] += len(valid_programs) - len(staged)
+
+        return counts["inserted"] + counts["updated"]
+
+    def _sync_staged(
+        self, cur, staged: List[Tuple[List[Any], Dict[str, Any]]]
+    ) -> Counter:
+        cur.execute(self.sync_staging_sql)
+
+        with cur.copy(self.sync_copy_sql) as copy:
+            copy.set_types(
+                [self.column_types[column][0] for column in PROGRAM_COLUMNS]
+                + ["text"] * len(SYNC_COLUMNS)
+            )
+            for row, _ in staged:
+                copy.write_row(row)
+
+        cur.execute(self.sync_update_sql)
+        updated_count = cur.rowcount
+        cur.execute(self.sync_insert_sql)
+        inserted_count = cur.rowcount
+        # the next sub-batch of this transaction reuses the staging table
+        cur.execute("DELETE FROM program_sync_staging")
+
+        return Counter(inserted=inserted_count, updated=updated_count)
+
+    def soft_delete_missing(self, uuids: List[str]) -> int:
+        """Marks every live row whose uuid is not in ``uuids`` as deleted."""
+        with self.pool.connection() as conn:
+            cur = conn.execute(self.soft_delete_sql, (list(uuids),))
+            return cur.rowcount
+
+    def _coerce_programs(
+        self, programs: List[Dict[str, Any]]
+    ) -> Tuple[List[List[Any]], List[Dict[str, Any]]]:
+        rows = []
+        valid_programs = []
 
-            conn.commit()
+        for program in programs:
+            try:
+                rows.append(
+                    [
+                        self._coerce(column, program.get(column))
+                        for column in PROGRAM_COLUMNS
+                    ]
+                )
+                valid_programs.append(program)
+            except (TypeError, ValueError) as e:
+                print(f"[!] Invalid program {program.get('uuid')}: {e}")
+                self.failures.write(program, f"{type(e).__name__}: {e}")
 
-        return inserted_count
+        return rows, valid_programs
 
     def close(self) -> None:
         self.pool.close()
+        self.failures.close()
 
     def __enter__(self):
         return self
@@ -0,0 +1,38 @@
+import struct
+from typing import List, Sequence
+
+import numpy as np
+from psycopg import Connection
+from psycopg.adapt import Dumper
+from psycopg.pq import Format
+from psycopg.types import TypeInfo
+
+
+class Vector:
+    """A pgvector value; sent to Postgres in pgvector's binary format."""
+
+    def __init__(self, values: Sequence[float]) -> None:
+        self.values = np.asarray(values, dtype=">f4").ravel()
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def tolist(self) -> List[float]:
+        return self.values.tolist()
+
+
+class VectorBinaryDumper(Dumper):
+    format = Format.BINARY
+
+    def dump(self, obj: Vector) -> bytes:
+        # int16 dimension, int16 unused, then big-endian float4 values
+        return struct.pack(">HH", len(obj.values), 0) + obj.values.tobytes()
+
+
+def register_vector(conn: Connection) -> None:
+    info = TypeInfo.fetch(conn, "vector")
+    if info is None:
+        raise RuntimeError("The pgvector extension is not installed.")
+
+    dumper = type("VectorBinaryDumper", (VectorBinaryDumper,), {"oid": info.oid})
+    conn.adapters.register_dumper(Vector, dumper)
@@ -1 +1,3 @@
 from .builder import graph
+from .cache import TrimCache
+from .runner import TrimRunner
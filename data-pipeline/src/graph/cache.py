@@ -0,0 +1,106 @@
+import hashlib
+import json
+import sqlite3
+import threading
+
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from .prompts import TRIM_PROGRAM_PROMPT_VERSION
+
+
+class TrimCache:
+    """Persistent cache of trim_program output.
+
+    Entries are keyed by the canonical raw program JSON, the prompt template
+    version and the model name, so editing the prompt or switching models
+    never serves stale output. Safe to share between TrimRunner threads.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS trim_cache (
+                key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                output TEXT NOT NULL,
+                created_at TEXT NOT NULL
+            )
+            """
+        )
+        self.conn.commit()
+
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(raw_program: Dict[str, Any], model: str) -> str:
+        canonical = json.dumps(raw_program, ensure_ascii=False, sort_keys=True)
+        data = f"{TRIM_PROGRAM_PROMPT_VERSION}\0{model}\0{canonical}"
+        return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+    def get(self, raw_program: Dict[str, Any], model: str) -> Optional[Dict[str, Any]]:
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT output FROM trim_cache WHERE key = ?",
+                (self.key(raw_program, model),),
+            ).fetchone()
+
+            if row is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            return json.loads(row[0])
+
+    def put(
+        self, raw_program: Dict[str, Any], model: str, output: Dict[str, Any]
+    ) -> None:
+        with self.lock:
+            self.conn.execute(
+                """
+                INSERT OR REPLACE INTO trim_cache (key, model, output, created_at)
+                VALUES (?, ?, ?, ?)
+                """,
+                (
+                    self.key(raw_program, model),
+                    model,
+                    json.dumps(output, ensure_ascii=False),
+                    datetime.now(timezone.utc).isoformat(),
+                ),
+            )
+            self.conn.commit()
+
+    def evict_older_than(self, max_age: timedelta) -> int:
+        cutoff = (datetime.now(timezone.utc) - max_age).isoformat()
+
+        with self.lock:
+            cur = self.conn.execute(
+                "DELETE FROM trim_cache WHERE created_at < ?", (cutoff,)
+            )
+            self.conn.commit()
+            return cur.rowcount
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            (entries,) = self.conn.execute("SELECT COUNT(*) FROM trim_cache").fetchone()
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "entries": entries,
+            }
+
+    def close(self) -> None:
+        with self.lock:
+            self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
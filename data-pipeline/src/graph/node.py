@@ -1,9 +1,11 @@
 import json
 from dotenv import load_dotenv
 from langchain_core.output_parsers import JsonOutputParser
+from langchain_core.runnables import RunnableConfig
 from langchain_google_genai import ChatGoogleGenerativeAI
 
 from graph.prompts import build_trim_program_prompt
+from utils.metrics import metrics
 
 from .state import GraphState
 
@@ -13,13 +15,39 @@ llm = ChatGoogleGenerativeAI(model="gemini-2.5-flash", temperature=0)
 parser = JsonOutputParser()
 
 
-def trim_program(state: GraphState):
+def model_name(chat_model) -> str:
+    return getattr(chat_model, "model", None) or type(chat_model).__name__
+
+
+def trim_program(state: GraphState, config: RunnableConfig):
     raw_program = state["raw_program"]
+    configurable = config.get("configurable", {})
+
+    # tests swap in a fake chat model through config["configurable"]["llm"]
+    chat_model = configurable.get("llm", llm)
+    cache = configurable.get("trim_cache")
+
+    if cache is not None:
+        cached = cache.get(raw_program, model_name(chat_model))
+        if cached is not None:
+            return {"trimmed_program": cached}
 
     prompt = build_trim_program_prompt(parser.get_format_instructions())
-    chain = prompt | llm | parser
+    chain = prompt | chat_model
+
+    with metrics.timer("llm_call_seconds"):
+        message = chain.invoke({"raw_program": json.dumps(raw_program)})
+
+    # the parser drops the message, so read token usage before parsing
+    usage = getattr(message, "usage_metadata", None) or {}
+    for kind in ("input_tokens", "output_tokens"):
+        if usage.get(kind):
+            metrics.inc("llm_tokens_total", usage[kind], kind=kind)
+
+    trimmed_program = parser.invoke(message)
 
-    trimmed_program = chain.invoke({"raw_program": json.dumps(raw_program)})
+    if cache is not None:
+        cache.put(raw_program, model_name(chat_model), trimmed_program)
 
     return {"trimmed_program": trimmed_program}
 
@@ -1,3 +1,5 @@
+import hashlib
+
 from langchain_core.prompts import PromptTemplate
 
 TRIM_PROGRAM_TEMPLATE_TEXT = """
@@ -83,6 +85,11 @@ Convert the raw_program JSON into the structured JSON format below.
 ```
 """
 
+# changes whenever the template text changes, invalidating cached LLM output
+TRIM_PROGRAM_PROMPT_VERSION = hashlib.sha256(
+    TRIM_PROGRAM_TEMPLATE_TEXT.encode("utf-8")
+).hexdigest()[:16]
+
 
 def build_trim_program_prompt(format_instructions: str):
     return PromptTemplate(
@@ -0,0 +1,135 @@
+import random
+import threading
+import time
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, Iterator, Optional, Tuple
+
+from langchain_core.runnables import RunnableConfig
+
+from utils.metrics import metrics
+
+from .builder import graph
+
+
+def is_rate_limit_error(error: BaseException) -> bool:
+    message = f"{type(error).__name__} {error}".lower()
+    return any(
+        marker in message
+        for marker in ("429", "resource_exhausted", "resourceexhausted", "quota")
+    )
+
+
+class AdaptiveLimiter:
+    """Concurrency limit that halves on throttling and creeps back up.
+
+    Additive increase / multiplicative decrease: every ``limit`` successful
+    calls raise the limit by one (up to ``max_limit``), every rate-limit
+    error halves it.
+    """
+
+    def __init__(self, max_limit: int) -> None:
+        self.max_limit = max_limit
+        self.limit = max_limit
+        self.active = 0
+        self.successes = 0
+        self.condition = threading.Condition()
+
+    def __enter__(self):
+        with self.condition:
+            while self.active >= self.limit:
+                self.condition.wait()
+            self.active += 1
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        with self.condition:
+            self.active -= 1
+            self.condition.notify_all()
+
+    def on_success(self) -> None:
+        with self.condition:
+            self.successes += 1
+            if self.successes >= self.limit and self.limit < self.max_limit:
+                self.limit += 1
+                self.successes = 0
+                self.condition.notify_all()
+
+    def on_throttle(self) -> None:
+        with self.condition:
+            self.limit = max(1, self.limit // 2)
+            self.successes = 0
+
+
+class TrimRunner:
+    """Runs the trim graph over many programs on a thread pool.
+
+    Results are yielded in input order. ``config`` is passed to every graph
+    call, e.g. ``{"configurable": {"llm": FakeListChatModel(...)}}`` in tests.
+
+    A program whose call fails for any reason other than throttling comes
+    back as an invalid result carrying the ``error``, so one bad response
+    does not abort the run. Throttling that outlasts ``max_retries`` still
+    raises: it means the quota is gone, and the checkpoint can resume later.
+    """
+
+    def __init__(
+        self,
+        concurrency: int = 4,
+        max_retries: int = 5,
+        backoff: float = 2.0,
+        config: Optional[RunnableConfig] = None,
+    ) -> None:
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.config = config
+        self.limiter = AdaptiveLimiter(concurrency)
+
+    def invoke(self, raw_program: Dict[str, Any]) -> Dict[str, Any]:
+        for attempt in range(self.max_retries + 1):
+            try:
+                with self.limiter:
+                    result = graph.invoke({"raw_program": raw_program}, self.config)
+            except Exception as e:
+                if not is_rate_limit_error(e):
+                    metrics.inc("trim_failed_total")
+                    print(f"[!] Trim failed for {raw_program.get('uuid')}: {e!r}")
+                    return {
+                        "raw_program": raw_program,
+                        "trimmed_program": None,
+                        "is_valid": False,
+                        "error": repr(e),
+                    }
+
+                if attempt == self.max_retries:
+                    raise
+
+                self.limiter.on_throttle()
+                metrics.inc("llm_throttled_total")
+                time.sleep(self.backoff * (2**attempt) * (0.5 + random.random()))
+                continue
+
+            self.limiter.on_success()
+            return result
+
+    def run(
+        self, items: Iterable[Tuple[Any, Dict[str, Any]]]
+    ) -> Iterator[Tuple[Any, Dict[str, Any]]]:
+        """Maps ``(tag, raw_program)`` pairs to ``(tag, result)`` in order."""
+        window = self.concurrency * 2
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            pending = deque()
+
+            for tag, raw_program in items:
+                pending.append((tag, executor.submit(self.invoke, raw_program)))
+
+                if len(pending) >= window:
+                    tag, future = pending.popleft()
+                    yield tag, future.result()
+
+            while pending:
+                tag, future = pending.popleft()
+                yield tag, future.result()
@@ -1 +1,2 @@
 from .loaders import BokjiroLoader, Subsidy24Loader
+from .index import CrawlIndex
@@ -0,0 +1,131 @@
+import asyncio
+import random
+import time
+
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+
+import httpx
+
+from utils.metrics import metrics
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """Allows ``rate`` acquisitions per second with bursts of up to ``burst``."""
+
+    def __init__(self, rate: float, burst: int = 1) -> None:
+        self.rate = rate
+        self.capacity = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(
+                    self.capacity, self.tokens + (now - self.updated) * self.rate
+                )
+                self.updated = now
+
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class AsyncFetcher:
+    """Pooled async HTTP client with per-host rate limits and retries.
+
+    At most ``concurrency`` requests are in flight, each host gets its own
+    token bucket, and timeouts, transport errors and 429/5xx responses are
+    retried with exponential backoff (honouring a numeric Retry-After).
+    """
+
+    def __init__(
+        self,
+        rate: float = 1.0,
+        burst: int = 1,
+        concurrency: int = 4,
+        max_retries: int = 3,
+        backoff: float = 1.0,
+        timeout: float = 10.0,
+        headers: Optional[Dict[str, str]] = None,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ) -> None:
+        # tests pass an httpx.MockTransport in place of the network
+        self.client = httpx.AsyncClient(
+            headers=headers,
+            timeout=timeout,
+            follow_redirects=True,
+            limits=httpx.Limits(max_connections=concurrency),
+            transport=transport,
+        )
+        self.rate = rate
+        self.burst = burst
+        self.buckets: Dict[str, TokenBucket] = {}
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.max_retries = max_retries
+        self.backoff = backoff
+
+    def _bucket(self, url: str) -> TokenBucket:
+        host = urlsplit(url).netloc
+        if host not in self.buckets:
+            self.buckets[host] = TokenBucket(self.rate, self.burst)
+        return self.buckets[host]
+
+    def _delay(self, attempt: int, response: Optional[httpx.Response]) -> float:
+        if response is not None:
+            retry_after = response.headers.get("Retry-After", "")
+            if retry_after.isdigit():
+                return float(retry_after)
+
+        return self.backoff * (2**attempt) * (0.5 + random.random())
+
+    async def request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        bucket = self._bucket(url)
+        host = urlsplit(url).netloc
+
+        for attempt in range(self.max_retries + 1):
+            response = None
+
+            async with self.semaphore:
+                # time spent throttled by the per-host rate limit
+                with metrics.timer("http_wait_seconds", host=host):
+                    await bucket.acquire()
+                try:
+                    with metrics.timer("http_fetch_seconds", host=host):
+                        response = await self.client.request(method, url, **kwargs)
+                except (httpx.TimeoutException, httpx.TransportError) as e:
+                    metrics.inc(
+                        "http_requests_total", host=host, status=type(e).__name__
+                    )
+                    if attempt == self.max_retries:
+                        raise
+                else:
+                    metrics.inc(
+                        "http_requests_total", host=host, status=response.status_code
+                    )
+                    if (
+                        response.status_code not in RETRY_STATUS_CODES
+                        or attempt == self.max_retries
+                    ):
+                        response.raise_for_status()
+                        return response
+
+            metrics.inc("http_retries_total", host=host)
+            with metrics.timer("http_wait_seconds", host=host):
+                await asyncio.sleep(self._delay(attempt, response))
+
+    async def get(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("POST", url, **kwargs)
+
+    async def aclose(self) -> None:
+        await self.client.aclose()
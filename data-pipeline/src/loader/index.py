@@ -0,0 +1,115 @@
+import hashlib
+import json
+import sqlite3
+
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterable, Set
+
+
+def content_hash(program: Dict[str, Any]) -> str:
+    canonical = json.dumps(program, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class CrawlIndex:
+    """Remembers which programs were crawled, when, and what they contained.
+
+    A fetch is first staged in ``crawl_pending`` and only becomes part of
+    ``crawl_index`` once ``confirm`` is called for it, after the program
+    reached the database. A program that fails or is interrupted anywhere
+    downstream therefore still counts as changed on the next run.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.conn = sqlite3.connect(path)
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS crawl_index (
+                source TEXT NOT NULL,
+                uuid TEXT NOT NULL,
+                content_hash TEXT NOT NULL,
+                fetched_at TEXT NOT NULL,
+                PRIMARY KEY (source, uuid)
+            )
+            """
+        )
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS crawl_pending (
+                source TEXT NOT NULL,
+                uuid TEXT NOT NULL,
+                content_hash TEXT NOT NULL,
+                fetched_at TEXT NOT NULL,
+                PRIMARY KEY (source, uuid)
+            )
+            """
+        )
+        self.conn.commit()
+
+    def fresh_uuids(self, source: str, max_age: timedelta) -> Set[str]:
+        """Uuids of ``source`` fetched within ``max_age``; these can be skipped."""
+        since = (datetime.now(timezone.utc) - max_age).isoformat()
+        rows = self.conn.execute(
+            "SELECT uuid FROM crawl_index WHERE source = ? AND fetched_at >= ?",
+            (source, since),
+        )
+        return {uuid for (uuid,) in rows}
+
+    def record(self, source: str, uuid: str, program: Dict[str, Any]) -> bool:
+        """Stages the fetch and returns True if the program is new or changed."""
+        new_hash = content_hash(program)
+
+        row = self.conn.execute(
+            "SELECT content_hash FROM crawl_index WHERE source = ? AND uuid = ?",
+            (source, uuid),
+        ).fetchone()
+
+        self.conn.execute(
+            """
+            INSERT INTO crawl_pending (source, uuid, content_hash, fetched_at)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT (source, uuid) DO UPDATE SET
+                content_hash = excluded.content_hash,
+                fetched_at = excluded.fetched_at
+            """,
+            (source, uuid, new_hash, datetime.now(timezone.utc).isoformat()),
+        )
+
+        return row is None or row[0] != new_hash
+
+    def confirm(self, uuids: Iterable[str]) -> int:
+        """Moves the staged fetches of ``uuids`` into the index and commits."""
+        params = [(uuid,) for uuid in uuids]
+        before = self.conn.total_changes
+
+        self.conn.executemany(
+            """
+            INSERT INTO crawl_index (source, uuid, content_hash, fetched_at)
+            SELECT source, uuid, content_hash, fetched_at
+            FROM crawl_pending WHERE uuid = ?
+            ON CONFLICT (source, uuid) DO UPDATE SET
+                content_hash = excluded.content_hash,
+                fetched_at = excluded.fetched_at
+            """,
+            params,
+        )
+        confirmed = self.conn.total_changes - before
+
+        self.conn.executemany("DELETE FROM crawl_pending WHERE uuid = ?", params)
+        self.conn.commit()
+
+        return confirmed
+
+    def commit(self) -> None:
+        self.conn.commit()
+
+    def close(self) -> None:
+        self.conn.commit()
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
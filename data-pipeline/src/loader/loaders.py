@@ -1,12 +1,12 @@
+import asyncio
 import json
 import re
-import time
 
 from abc import ABC, abstractmethod
 from typing import Any, List, Set, Dict, Optional
 
 from bs4 import BeautifulSoup
-import requests
+import httpx
 
 
 from utils.config import (
@@ -17,53 +17,131 @@ from utils.config import (
     SUBSIDY24_UUID_ENDPOINT,
 )
 
+from .http import AsyncFetcher
+
 
 class Loader(ABC):
+    """Crawls one portal page by page.
+
+    Use it as an async context manager and call ``aload(page)``; requests go
+    through a shared AsyncFetcher so detail pages are fetched concurrently
+    within the per-host ``rate`` (requests/second) budget. ``load(page)`` is
+    a blocking convenience wrapper for one-off use.
+
+    Detail pages of uuids in ``prev_uuids`` are not fetched. Listings are
+    newest first, so once a page lists only such uuids ``exhausted`` is set
+    and the caller can stop paging.
+
+    ``reached_end`` is set once a listing page comes back empty, i.e. every
+    page of the listing has been read.
+    """
+
+    headers: Dict[str, str] = {}
+
     def __init__(
         self,
         max_page: int,
         api_key: str = None,
         prev_uuids: Optional[Set[str]] = None,
+        rate: float = 1.0,
+        burst: int = 1,
+        concurrency: int = 4,
+        max_retries: int = 3,
     ):
         self.api_key = api_key
         self.prev_uuids = prev_uuids
         self.max_page = max_page
 
-    @abstractmethod
-    def load(self, page: int) -> list[int]:
-        raise NotImplementedError
+        self.rate = rate
+        self.burst = burst
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.fetcher: Optional[AsyncFetcher] = None
+        self.exhausted = False
+        self.reached_end = False
+        self.skipped = 0
+
+    async def __aenter__(self):
+        self.fetcher = AsyncFetcher(
+            rate=self.rate,
+            burst=self.burst,
+            concurrency=self.concurrency,
+            max_retries=self.max_retries,
+            headers=self.headers,
+        )
+        await self._start_session()
+        return self
 
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.fetcher.aclose()
+        self.fetcher = None
 
-class BokjiroLoader(Loader):
-    def __init__(self, max_page, api_key=None, prev_uuids=None):
-        super().__init__(max_page, api_key, prev_uuids)
-
-        self.session = self._start_session()
-
-    def _start_session(self) -> requests.Session:
-        headers = {
-            "Accept": "*/*",
-            "Accept-Language": "ko-KR,ko;q=0.9,en-US;q=0.8,en;q=0.7",
-            "Content-Type": "application/json; charset=UTF-8",
-            "Host": "www.bokjiro.go.kr",
-            "Origin": "https://www.bokjiro.go.kr",
-            "Referer": BOKJIRO_SESSION_ENDPOINT,
-            "Sec-Fetch-Dest": "empty",
-            "Sec-Fetch-Mode": "cors",
-            "Sec-Fetch-Site": "same-origin",
-            "X-Requested-With": "XMLHttpRequest",
-            "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/141.0.0.0 Safari/537.36",
-        }
+    async def _start_session(self) -> None:
+        pass
+
+    def _check_end(self, uuids: List[str]) -> None:
+        if not uuids:
+            self.reached_end = True
+
+    def _skip_known(self, uuids: List[str]) -> List[str]:
+        if self.prev_uuids is None:
+            return uuids
+
+        new_uuids = [uuid for uuid in uuids if uuid not in self.prev_uuids]
+        if not new_uuids:
+            self.exhausted = True
+
+        return new_uuids
+
+    async def _gather_programs(self, fetches) -> List[Dict[str, Any]]:
+        results = await asyncio.gather(*fetches, return_exceptions=True)
+
+        programs = []
+        for result in results:
+            if isinstance(result, Exception):
+                print(f"[!] ({self}) Skipping program: {result!r}")
+                self.skipped += 1
+            elif result is not None:
+                programs.append(result)
+
+        return programs
+
+    @abstractmethod
+    async def aload(self, page: int) -> List[Dict[str, Any]]:
+        raise NotImplementedError
 
-        session = requests.Session()
-        session.headers.update(headers)
+    def load(self, page: int) -> List[Dict[str, Any]]:
+        async def run():
+            async with self:
+                return await self.aload(page)
 
-        response = session.get(BOKJIRO_SESSION_ENDPOINT)
-        response.raise_for_status()
+        return asyncio.run(run())
 
-        return session
 
-    def _load_uuids(self, page: int, targets: List[str]) -> Dict[str, List[str]]:
+class BokjiroLoader(Loader):
+    session_endpoint = BOKJIRO_SESSION_ENDPOINT
+    uuid_endpoint = BOKJIRO_UUID_ENDPOINT
+    program_endpoint = BOKJIRO_PROGRAM_ENDPOINT
+
+    headers = {
+        "Accept": "*/*",
+        "Accept-Language": "ko-KR,ko;q=0.9,en-US;q=0.8,en;q=0.7",
+        "Content-Type": "application/json; charset=UTF-8",
+        "Host": "www.bokjiro.go.kr",
+        "Origin": "https://www.bokjiro.go.kr",
+        "Referer": BOKJIRO_SESSION_ENDPOINT,
+        "Sec-Fetch-Dest": "empty",
+        "Sec-Fetch-Mode": "cors",
+        "Sec-Fetch-Site": "same-origin",
+        "X-Requested-With": "XMLHttpRequest",
+        "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/141.0.0.0 Safari/537.36",
+    }
+
+    async def _start_session(self) -> None:
+        # the portal only answers API calls that carry its session cookies
+        await self.fetcher.get(self.session_endpoint)
+
+    async def _load_uuids(self, page: int, targets: List[str]) -> Dict[str, List[str]]:
         payload = {
             "dmSearchParam": {
                 "page": str(page),
@@ -89,11 +167,9 @@ class BokjiroLoader(Loader):
             },
         }
 
-        response = self.session.post(
-            BOKJIRO_UUID_ENDPOINT, data=json.dumps(payload), timeout=10
+        response = await self.fetcher.post(
+            self.uuid_endpoint, content=json.dumps(payload)
         )
-        time.sleep(1)
-        response.raise_for_status()
         response_json = response.json()
 
         central_services = response_json["dsServiceList1"]
@@ -109,50 +185,56 @@ class BokjiroLoader(Loader):
 
         return uuids
 
-    def _load_programs(self, uuids: List[str], operating: str) -> List[Dict[str, Any]]:
-        programs = []
-
-        for uuid in uuids:
-            endpoint = BOKJIRO_PROGRAM_ENDPOINT.format(uuid)
+    async def _load_program(
+        self, uuid: str, operating: str
+    ) -> Optional[Dict[str, Any]]:
+        endpoint = self.program_endpoint.format(uuid)
 
-            response = self.session.get(endpoint)
-            response.raise_for_status()
-            time.sleep(1)
+        response = await self.fetcher.get(endpoint)
 
-            html_bytes = response.content
-            html_text = html_bytes.decode("utf-8")
+        html_bytes = response.content
+        html_text = html_bytes.decode("utf-8")
 
-            match = re.search(
-                r"cpr\.core\.Platform\.INSTANCE\.initParameter\((.*?)\);cpr\.core\.Platform\.INSTANCE\.lookup",
-                html_text,
-                re.DOTALL,
-            )
+        match = re.search(
+            r"cpr\.core\.Platform\.INSTANCE\.initParameter\((.*?)\);cpr\.core\.Platform\.INSTANCE\.lookup",
+            html_text,
+            re.DOTALL,
+        )
 
-            if not match:
-                continue
+        if not match:
+            return None
 
-            data_json = json.loads(match.group(1))
-            program = json.loads(data_json["initValue"]["dmWlfareInfo"])
+        data_json = json.loads(match.group(1))
+        program = json.loads(data_json["initValue"]["dmWlfareInfo"])
 
-            program["program_operating_entity"] = operating
-            program["reference_url"] = endpoint
+        program["uuid"] = uuid
+        program["program_operating_entity"] = operating
+        program["reference_url"] = endpoint
 
-            programs.append(program)
+        return program
 
-        return programs
+    async def _load_programs(
+        self, uuids: List[str], operating: str
+    ) -> List[Dict[str, Any]]:
+        return await self._gather_programs(
+            [self._load_program(uuid, operating) for uuid in uuids]
+        )
 
-    def load(self, page: int) -> List[Dict[str, Any]]:
+    async def aload(self, page: int) -> List[Dict[str, Any]]:
         programs = []
 
         targets = ["중장년", "노년"]
 
-        uuids = self._load_uuids(page=page, targets=targets)
+        uuids = await self._load_uuids(page=page, targets=targets)
+        self._check_end(uuids["central"] + uuids["local"])
 
-        central_program_batch = self._load_programs(
-            uuids=uuids["central"], operating="central"
-        )
-        local_program_batch = self._load_programs(
-            uuids=uuids["local"], operating="local"
+        new_uuids = set(self._skip_known(uuids["central"] + uuids["local"]))
+        central_uuids = [uuid for uuid in uuids["central"] if uuid in new_uuids]
+        local_uuids = [uuid for uuid in uuids["local"] if uuid in new_uuids]
+
+        central_program_batch, local_program_batch = await asyncio.gather(
+            self._load_programs(uuids=central_uuids, operating="central"),
+            self._load_programs(uuids=local_uuids, operating="local"),
         )
 
         programs.extend(central_program_batch)
@@ -165,16 +247,17 @@ class BokjiroLoader(Loader):
 
 
 class Subsidy24Loader(Loader):
-    def _load_uuids(self, page: int):
+    uuid_endpoint = SUBSIDY24_UUID_ENDPOINT
+    program_endpoint = SUBSIDY24_PROGRAM_ENDPOINT
+
+    async def _load_uuids(self, page: int):
         params = {
             "sort": "DATE",
             "query": "노인 어르신 고령",
             "startCount": (page - 1) * 12,
         }
 
-        response = requests.get(SUBSIDY24_UUID_ENDPOINT, params=params, timeout=10)
-        time.sleep(1)
-        response.raise_for_status()
+        response = await self.fetcher.get(self.uuid_endpoint, params=params)
 
         soup = BeautifulSoup(response.text, "html.parser")
         card_links = soup.select("a.card-title")
@@ -210,7 +293,7 @@ class Subsidy24Loader(Loader):
             return "\n".join(line for line in lines if line)
         return None
 
-    def _trim(self, response: requests.Response):
+    def _trim(self, response: httpx.Response):
         soup = BeautifulSoup(response.text, "html.parser")
 
         program = {}
@@ -263,27 +346,24 @@ class Subsidy24Loader(Loader):
 
         return program
 
-    def _load_programs(self, uuids: List[str]) -> List[Dict[str, Any]]:
-        programs = []
+    async def _load_program(self, uuid: str) -> Dict[str, Any]:
+        endpoint = self.program_endpoint.format(uuid)
 
-        for uuid in uuids:
-            endpoint = SUBSIDY24_PROGRAM_ENDPOINT.format(uuid)
+        response = await self.fetcher.get(endpoint)
 
-            response = requests.get(endpoint, timeout=10)
-            time.sleep(1)
-            response.raise_for_status()
+        program = self._trim(response)
+        program["uuid"] = uuid
+        program["reference_url"] = endpoint
 
-            program = self._trim(response)
-            program["uuid"] = uuid
-            program["reference_url"] = endpoint
+        return program
 
-            programs.append(program)
+    async def _load_programs(self, uuids: List[str]) -> List[Dict[str, Any]]:
+        return await self._gather_programs([self._load_program(uuid) for uuid in uuids])
 
-        return programs
-
-    def load(self, page: int) -> List[Dict[str, Any]]:
-        uuids = self._load_uuids(page)
-        programs = self._load_programs(uuids)
+    async def aload(self, page: int) -> List[Dict[str, Any]]:
+        uuids = await self._load_uuids(page)
+        self._check_end(uuids)
+        programs = await self._load_programs(self._skip_known(uuids))
 
         return programs
 
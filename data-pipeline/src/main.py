@@ -1,21 +1,41 @@
+import asyncio
 import json
 import os
 import argparse
 
-from datetime import datetime, timezone
+from contextlib import ExitStack
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
 from pydoc import apropos
 from typing import Any, Dict, List
 from urllib.parse import quote_plus
 
+import numpy as np
+
 from dotenv import load_dotenv
 from tqdm import tqdm
 
-from graph import graph
-from loader import BokjiroLoader, Subsidy24Loader
-from utils.errors import MismatchError
-from vectorizer import Vectorizer
-from database.manager import PostgresManager
+from ann import IVFIndex, recall_report
+from graph import TrimCache, TrimRunner
+from loader import BokjiroLoader, CrawlIndex, Subsidy24Loader
+from utils.errors import MismatchError, PartialInputError, ResumeError
+from utils.metrics import metrics
+from vectorizer import (
+    BACKENDS,
+    EmbeddingMatrix,
+    EmbeddingMatrixWriter,
+    EmbeddingStore,
+    PooledVectorizer,
+    Vectorizer,
+    check_parity,
+    generate_program_text,
+    matrix_paths,
+    read_matrix_meta,
+    write_matrix_meta,
+)
+from database import PostgresManager, Vector
+from pipeline import Appender, JsonlAppender, RunManifest, StreamPipeline, batched
 
 load_dotenv()
 
@@ -36,9 +56,17 @@ raw_path = data_dir / "raw_programs.jsonl"
 raw_path_ts = data_dir / f"raw_programs_{ts}.jsonl"
 trimmed_path = data_dir / "trimmed_programs.jsonl"
 trimmed_path_ts = data_dir / f"trimmed_programs_{ts}.jsonl"
-embedding_path = data_dir / "embeddings.jsonl"
-embedding_path_ts = data_dir / f"embeddings_{ts}.jsonl"
+# embedding matrices: <base>.bin, <base>.index.jsonl and <base>.meta.json
+embedding_path = data_dir / "embeddings"
+embedding_path_ts = data_dir / f"embeddings_{ts}"
 save_failure_path = data_dir / f"save_failures_{ts}.jsonl"
+crawl_index_path = data_dir / "crawl_index.sqlite3"
+trim_cache_path = data_dir / "trim_cache.sqlite3"
+run_manifest_path = data_dir / "run_manifest.json"
+embedding_store_path = data_dir / "embedding_store.sqlite3"
+ann_index_path = data_dir / "ann_index"
+# run report of this invocation: <base>.json and <base>.prom
+metrics_path = data_dir / f"metrics_{ts}"
 
 
 def create_parser():
@@ -46,15 +74,71 @@ def create_parser():
 
     parser.add_argument(
         "mode",
-        choices=["load", "trim", "vectorize", "save", "all"],
+        choices=[
+            "load",
+            "trim",
+            "vectorize",
+            "save",
+            "all",
+            "stream",
+            "index",
+            "parity",
+        ],
     )
 
     parser.add_argument("--load-max-page-bokjiro", type=int, default=1)
     parser.add_argument("--load-max-page-subsidy24", type=int, default=1)
+    parser.add_argument("--load-rate", type=float, default=1.0)
+    parser.add_argument("--load-burst", type=int, default=1)
+    parser.add_argument("--load-concurrency", type=int, default=4)
+    parser.add_argument("--load-max-retries", type=int, default=3)
+    parser.add_argument(
+        "--load-incremental",
+        action="store_true",
+        help="emit only programs that are new or changed since they last reached "
+        "the DB, and skip detail pages fetched within --load-refresh-days. "
+        "raw_programs.jsonl and every later output then hold only that delta, "
+        "not the full catalogue",
+    )
+    parser.add_argument("--load-refresh-days", type=float, default=7)
+    parser.add_argument("--trim-concurrency", type=int, default=4)
+    parser.add_argument("--trim-max-retries", type=int, default=5)
+    parser.add_argument("--trim-no-cache", action="store_true")
+    parser.add_argument("--trim-cache-max-age-days", type=float, default=30)
     parser.add_argument("--vectorize-batch-size", type=int, default=32)
+    parser.add_argument("--vectorize-max-tokens", type=int, default=8192)
+    parser.add_argument("--vectorize-window", type=int, default=1024)
+    parser.add_argument("--vectorize-backend", choices=BACKENDS, default="torch")
+    parser.add_argument("--vectorize-onnx-file", type=str, default=None)
+    parser.add_argument("--vectorize-no-store", action="store_true")
+    parser.add_argument("--vectorize-workers", type=int, default=1)
+    parser.add_argument("--vectorize-threads", type=int, default=None)
+    parser.add_argument(
+        "--vectorize-dtype", choices=["float32", "float16"], default="float32"
+    )
     parser.add_argument("--db-commit-batch-size", type=int, default=32)
+    parser.add_argument(
+        "--db-save-mode", choices=["row", "bulk", "sync"], default="bulk"
+    )
+    parser.add_argument(
+        "--db-sync-delete",
+        action="store_true",
+        help="soft-delete programs missing from this run's input. only allowed "
+        "when the run itself loads the full catalogue: mode all with sync "
+        "saves, no --load-incremental or --resume, and every loader paging "
+        "until its listing runs out (see --load-max-page-*)",
+    )
     parser.add_argument("--db-min-pool-size", type=int, default=1)
     parser.add_argument("--db-max-pool-size", type=int, default=3)
+    parser.add_argument("--db-save-workers", type=int, default=None)
+    parser.add_argument("--index-lists", type=int, default=None)
+    parser.add_argument("--index-iterations", type=int, default=20)
+    parser.add_argument("--index-k", type=int, default=10)
+    parser.add_argument("--index-queries", type=int, default=200)
+    parser.add_argument("--resume", action="store_true")
+    parser.add_argument("--checkpoint-every", type=int, default=16)
+    parser.add_argument("--stream-queue-size", type=int, default=256)
+    parser.add_argument("--stream-snapshots", action="store_true")
 
     return parser
 
@@ -71,187 +155,671 @@ def save_raw_programs(programs: List[Dict[str, Any]]):
     print(f"Saved {len(programs)} raw programs.")
 
 
-def do_load(args):
-    print("[*] Start loading...")
-    loaders = [
-        BokjiroLoader(
-            max_page=args.load_max_page_bokjiro,
-        ),
-        Subsidy24Loader(
-            max_page=args.load_max_page_subsidy24,
-        ),
-    ]
+def write_jsonl(files, obj):
+    json_string = json.dumps(obj, ensure_ascii=False) + "\n"
+    for f in files:
+        f.write(json_string)
+
 
+async def load_programs(loaders, crawl_index, incremental, emit) -> int:
     count = 0
-    with raw_path.open("w", encoding="utf-8") as f, raw_path_ts.open(
-        "w", encoding="utf-8"
-    ) as f_ts:
-        for loader in loaders:
-            print(f"Running {loader}...")
 
+    for loader in loaders:
+        print(f"Running {loader}...")
+
+        async with loader:
             for page in tqdm(
                 range(1, loader.max_page + 1),
                 desc=f"{loader}",
                 unit="page",
             ):
                 # TODO: try catch load for each page
-                programs = loader.load(page)
+                programs = await loader.aload(page)
 
                 for program in programs:
-                    json_string = json.dumps(program, ensure_ascii=False) + "\n"
-                    f.write(json_string)
-                    f_ts.write(json_string)
+                    changed = crawl_index.record(f"{loader}", program["uuid"], program)
+
+                    # unchanged programs have already gone through the pipeline
+                    if incremental and not changed:
+                        continue
+
+                    emit(program)
+                    count += 1
+
+                crawl_index.commit()
+
+                if loader.reached_end:
+                    print(f"{loader} reached the end of its listing at page {page}.")
+                    break
+
+                if loader.exhausted:
+                    print(f"{loader} reached already crawled programs at page {page}.")
+                    break
+
+    return count
+
+
+def create_loaders(args, crawl_index):
+    http_options = {
+        "rate": args.load_rate,
+        "burst": args.load_burst,
+        "concurrency": args.load_concurrency,
+        "max_retries": args.load_max_retries,
+    }
+    refresh_age = timedelta(days=args.load_refresh_days)
+
+    def prev_uuids(loader_cls):
+        if not args.load_incremental:
+            return None
+        return crawl_index.fresh_uuids(loader_cls.__name__, refresh_age)
+
+    return [
+        BokjiroLoader(
+            max_page=args.load_max_page_bokjiro,
+            prev_uuids=prev_uuids(BokjiroLoader),
+            **http_options,
+        ),
+        Subsidy24Loader(
+            max_page=args.load_max_page_subsidy24,
+            prev_uuids=prev_uuids(Subsidy24Loader),
+            **http_options,
+        ),
+    ]
+
+
+def open_trim_cache(args):
+    if args.trim_no_cache:
+        return None
+
+    trim_cache = TrimCache(trim_cache_path)
+    max_age = timedelta(days=args.trim_cache_max_age_days)
+    print(f"Evicted {trim_cache.evict_older_than(max_age)} stale cached trims.")
+    return trim_cache
+
+
+def create_trim_runner(args, trim_cache):
+    return TrimRunner(
+        concurrency=args.trim_concurrency,
+        max_retries=args.trim_max_retries,
+        config={"configurable": {"trim_cache": trim_cache}},
+    )
+
+
+def open_embedding_store(args):
+    if args.vectorize_no_store:
+        return None
+    return EmbeddingStore(embedding_store_path)
+
+
+def create_vectorizer(args, embedding_store):
+    options = {
+        "backend": args.vectorize_backend,
+        "onnx_file": args.vectorize_onnx_file,
+        "store": embedding_store,
+        "batch_size": args.vectorize_batch_size,
+        "max_tokens": args.vectorize_max_tokens or None,
+    }
+
+    if args.vectorize_workers > 1:
+        return PooledVectorizer(
+            workers=args.vectorize_workers,
+            threads=args.vectorize_threads,
+            **options,
+        )
+    return Vectorizer(**options)
+
+
+def embedding_hash(program, model: str) -> str:
+    """Identifies the embedding input, like the embedding store's key."""
+    return EmbeddingStore.key(generate_program_text(program), model)
+
+
+def confirm_crawled(uuids: List[str]) -> None:
+    """Marks programs that reached the DB as crawled, see CrawlIndex."""
+    with CrawlIndex(crawl_index_path) as crawl_index:
+        confirmed = crawl_index.confirm(uuids)
+    print(f"Confirmed {confirmed} crawled programs in the crawl index.")
+
+
+def create_db_manager(args):
+    return PostgresManager(
+        conn_string=DATABASE_URL,
+        failure_path=save_failure_path,
+        min_pool_size=args.db_min_pool_size,
+        max_pool_size=args.db_max_pool_size,
+    )
 
-                count += len(programs)
 
+def select_save_programs(args, db_manager):
+    if args.db_save_mode == "bulk":
+        return db_manager.save_programs_bulk
+    if args.db_save_mode == "sync":
+        db_manager.check_sync_schema()
+        return db_manager.save_programs_sync
+    return db_manager.save_programs
+
+
+def save_workers(args) -> int:
+    # more writers than pooled connections would only queue on the pool
+    return min(args.db_save_workers or args.db_max_pool_size, args.db_max_pool_size)
+
+
+def do_load(args, manifest: RunManifest):
+    print("[*] Start loading...")
+    checkpoint = manifest.begin("load")
+
+    with CrawlIndex(crawl_index_path) as crawl_index:
+        loaders = create_loaders(args, crawl_index)
+
+        with metrics.stage("load"), raw_path.open(
+            "w", encoding="utf-8"
+        ) as f, raw_path_ts.open("w", encoding="utf-8") as f_ts:
+            count = asyncio.run(
+                load_programs(
+                    loaders,
+                    crawl_index,
+                    args.load_incremental,
+                    lambda program: write_jsonl((f, f_ts), program),
+                )
+            )
+
+    checkpoint.finish(
+        incremental=args.load_incremental,
+        skipped=sum(loader.skipped for loader in loaders),
+        reached_end={f"{loader}": loader.reached_end for loader in loaders},
+    )
+    metrics.add_items("load", count)
     print(f"Total {count} programs are loaded.\n")
 
 
-def do_trim(args) -> List[Dict[str, Any]]:
+def do_trim(args, manifest: RunManifest):
     print("[*] Start trimming...")
+    checkpoint = manifest.begin("trim")
+    checkpoint.check_input(raw_path)
+
+    offset = checkpoint.input_offset
+    count = checkpoint.count
+    dropped = checkpoint.state.get("dropped", 0)
+    if checkpoint.resumed:
+        print(f"Resuming after {count} trimmed programs.")
 
-    count = 0
     total_bytes = raw_path.stat().st_size
 
-    with raw_path.open("r", encoding="utf-8") as f_in, trimmed_path.open(
-        "w", encoding="utf-8"
-    ) as f_out, trimmed_path_ts.open("w", encoding="utf-8") as f_out_ts, tqdm(
-        total=total_bytes, desc="Trimming Programs", unit="B", unit_scale=True
+    trim_cache = open_trim_cache(args)
+    runner = create_trim_runner(args, trim_cache)
+
+    with metrics.stage("trim"), raw_path.open("rb") as f_in, tqdm(
+        total=total_bytes,
+        initial=offset,
+        desc="Trimming Programs",
+        unit="B",
+        unit_scale=True,
     ) as pbar:
-        for line in f_in:
-            raw_program = json.loads(line)
-            result = graph.invoke({"raw_program": raw_program})
+        f_in.seek(offset)
+        outputs = checkpoint.open_outputs(trimmed_path, trimmed_path_ts)
+        raw_programs = ((line, json.loads(line)) for line in f_in)
+        pending = 0
 
+        # results come back in input order, so offset always marks a prefix
+        for line, result in runner.run(raw_programs):
             is_valid = result["is_valid"]
             program = result["trimmed_program"]
 
             if is_valid:
-                json_string = json.dumps(program, ensure_ascii=False) + "\n"
-                f_out.write(json_string)
-                f_out_ts.write(json_string)
+                for out in outputs:
+                    out.write(program)
                 count += 1
-            pbar.update(len(line.encode("utf-8")))
-
-        print(f"Total {count} programs are trimmed.\n")
+                metrics.add_items("trim", 1)
+            else:
+                dropped += 1
+
+            offset += len(line)
+            pending += 1
+            if pending >= args.checkpoint_every:
+                checkpoint.commit(offset, count, dropped=dropped)
+                pending = 0
+            pbar.update(len(line))
+
+        checkpoint.commit(offset, count, dropped=dropped)
+        checkpoint.finish()
+        print(f"Total {count} programs are trimmed.")
+
+    if trim_cache is not None:
+        print(f"Trim cache: {trim_cache.stats()}")
+        trim_cache.close()
+    print()
+
+
+def create_matrix_writer(args, vectorizer, open_output, start_row: int = 0):
+    """Opens the plain and timestamped embedding matrices for appending.
+
+    ``open_output(path, cls)`` opens a single file of a matrix.
+    """
+    bases = (embedding_path, embedding_path_ts)
+
+    for base in bases:
+        write_matrix_meta(
+            base, vectorizer.dim, args.vectorize_dtype, vectorizer.model_id
+        )
+
+    return EmbeddingMatrixWriter(
+        [open_output(matrix_paths(base)[0], Appender) for base in bases],
+        [open_output(matrix_paths(base)[1], JsonlAppender) for base in bases],
+        args.vectorize_dtype,
+        start_row=start_row,
+    )
 
 
-def do_vectorize(args):
+def do_vectorize(args, manifest: RunManifest):
     print("[*] Start vectorizing...")
-    count = 0
+    checkpoint = manifest.begin("vectorize")
+    checkpoint.check_input(trimmed_path)
+
+    offset = checkpoint.input_offset
+    count = checkpoint.count
+    if checkpoint.resumed:
+        print(f"Resuming after {count} vectorized programs.")
+
     total_bytes = trimmed_path.stat().st_size
 
-    batch_size = args.vectorize_batch_size
-    vectorizer = Vectorizer()
+    embedding_store = open_embedding_store(args)
+    vectorizer = create_vectorizer(args, embedding_store)
 
-    with trimmed_path.open("r", encoding="utf-8") as f_in, embedding_path.open(
-        "w", encoding="utf-8"
-    ) as f_out, embedding_path_ts.open("w", encoding="utf-8") as f_out_ts, tqdm(
-        total=total_bytes, desc="Vectorize", unit="B", unit_scale=True
+    with metrics.stage("vectorize"), trimmed_path.open("rb") as f_in, tqdm(
+        total=total_bytes, initial=offset, desc="Vectorize", unit="B", unit_scale=True
     ) as pbar:
-        program_batch = []
-        uuid_batch = []
+        f_in.seek(offset)
+        meta = read_matrix_meta(embedding_path)
+        if checkpoint.resumed and meta and meta["dtype"] != args.vectorize_dtype:
+            raise ResumeError(f"[!] Embeddings were written as {meta['dtype']}.")
+        writer = create_matrix_writer(
+            args, vectorizer, checkpoint.open_output, start_row=checkpoint.count
+        )
+        lines = ((line, json.loads(line)) for line in f_in)
 
-        for line in f_in:
-            program = json.loads(line)
-            program_batch.append(program)
-            uuid_batch.append(program["uuid"])
+        for batch in batched(lines, args.vectorize_window):
+            programs = [program for _, program in batch]
+            vector_batch = vectorizer.run(programs)
 
-            if len(program_batch) >= batch_size:
-                vector_batch = vectorizer.run(program_batch)
+            if len(vector_batch) != len(programs):
+                raise MismatchError("[!] Vectorizer output does not match its batch.")
 
-                if len(vector_batch) == len(uuid_batch):
-                    for uuid, vector in zip(uuid_batch, vector_batch):
-                        data = {"uuid": uuid, "embedding": vector.tolist()}
-                        json_string = json.dumps(data, ensure_ascii=False) + "\n"
-                        f_out.write(json_string)
-                        f_out_ts.write(json_string)
+            for program, vector in zip(programs, vector_batch):
+                writer.write(program, vector)
 
-                    count += len(vector_batch)
-                    program_batch = []
-                    uuid_batch = []
+            batch_bytes = sum(len(line) for line, _ in batch)
+            offset += batch_bytes
+            count += len(vector_batch)
+            checkpoint.commit(offset, count)
+            metrics.add_items("vectorize", len(vector_batch))
+            pbar.update(batch_bytes)
 
-            pbar.update(len(line.encode("utf-8")))
+        checkpoint.finish()
 
-        if program_batch and uuid_batch:
-            vector_batch = vectorizer.run(program_batch)
+    vectorizer.close()
+    print(f"Total {count} programs are vectorized.")
 
-            if len(vector_batch) == len(uuid_batch):
-                for uuid, vector in zip(uuid_batch, vector_batch):
-                    data = {"uuid": uuid, "embedding": vector.tolist()}
-                    json_string = json.dumps(data, ensure_ascii=False) + "\n"
-                    f_out.write(json_string)
-                    f_out_ts.write(json_string)
+    if embedding_store is not None:
+        print(f"Embedding store: {embedding_store.stats()}")
+        embedding_store.close()
+    print()
 
-                count += len(vector_batch)
-                program_batch = []
-                uuid_batch = []
 
-    print(f"Total {count} programs are vectorized.\n")
+def save_in_parallel(save_programs, batches, workers: int) -> int:
+    """Saves batches on ``workers`` threads, each holding its own connection.
 
+    At most ``workers * 2`` batches are read ahead of the writers.
+    """
+    count = 0
+    max_in_flight = workers * 2
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        in_flight = set()
+
+        for batch in batches:
+            if len(in_flight) >= max_in_flight:
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                count += sum(future.result() for future in done)
+
+            in_flight.add(executor.submit(save_programs, batch))
+
+        count += sum(future.result() for future in as_completed(in_flight))
+
+    return count
+
+
+def check_full_catalogue(manifest: RunManifest):
+    """Raises unless this run loaded and trimmed every listed program.
 
-def do_save(args):
+    Soft-deleting whatever a partial input lacks would retire live programs.
+    """
+    load = manifest.stage("load")
+    trim = manifest.stage("trim")
+
+    if load.get("status") != "done" or load.get("incremental", True):
+        raise PartialInputError("[!] --db-sync-delete needs a full load in this run.")
+
+    unfinished = [
+        name for name, done in load.get("reached_end", {}).items() if not done
+    ]
+    if unfinished:
+        raise PartialInputError(
+            f"[!] {', '.join(unfinished)} stopped before the end of the listing, "
+            "refusing to sync-delete. Raise --load-max-page-*."
+        )
+    if load.get("skipped"):
+        raise PartialInputError(
+            f"[!] {load['skipped']} programs failed to load, refusing to sync-delete."
+        )
+    if trim.get("dropped"):
+        raise PartialInputError(
+            f"[!] {trim['dropped']} programs failed to trim, refusing to sync-delete."
+        )
+
+
+def do_save(args, manifest: RunManifest):
     print("[*] Start saving to DB...")
+    if args.db_sync_delete:
+        check_full_catalogue(manifest)
+    checkpoint = manifest.begin("save")
 
-    with PostgresManager(
-        conn_string=DATABASE_URL,
-        failure_path=save_failure_path,
-        min_pool_size=args.db_min_pool_size,
-        max_pool_size=args.db_max_pool_size,
-    ) as db_manager:
+    matrix = EmbeddingMatrix(embedding_path)
+    missing = 0
+    seen_uuids = []
+    saved_uuids = []
 
-        count = 0
-        total_bytes = trimmed_path.stat().st_size + embedding_path.stat().st_size
+    with metrics.stage("save"), create_db_manager(args) as db_manager:
 
-        batch = []
+        total_bytes = trimmed_path.stat().st_size
         batch_size = args.db_commit_batch_size
+        workers = save_workers(args)
+        save_programs = select_save_programs(args, db_manager)
 
-        with trimmed_path.open("r", encoding="utf-8") as f_p, embedding_path.open(
-            "r", encoding="utf-8"
-        ) as f_e, tqdm(
+        with trimmed_path.open("rb") as f_p, tqdm(
             total=total_bytes, desc="Save", unit="B", unit_scale=True
         ) as pbar:
-            for line_p, line_e in zip(f_p, f_e):
-                program = json.loads(line_p)
-                embedding = json.loads(line_e)
 
-                if program["uuid"] != embedding["uuid"]:
-                    raise MismatchError("[!] The Embedding does not match the Program.")
+            def read_batches():
+                nonlocal missing
+                batch = []
 
-                program["embedding"] = str(embedding["embedding"])
-                batch.append(program)
+                for line in f_p:
+                    program = json.loads(line)
+                    seen_uuids.append(program["uuid"])
+                    pbar.update(len(line))
 
-                if len(batch) >= batch_size:
-                    count += db_manager.save_programs(batch)
-                    batch = []
+                    vector = matrix.get(program["uuid"])
+                    if vector is None:
+                        missing += 1
+                        continue
 
-                pbar.update(len(line_p.encode("utf-8")) + len(line_e.encode("utf-8")))
+                    program["embedding"] = Vector(vector)
+                    program["embedding_hash"] = embedding_hash(program, matrix.model)
+                    saved_uuids.append(program["uuid"])
+                    batch.append(program)
+
+                    if len(batch) >= batch_size:
+                        yield batch
+                        batch = []
+
+                if batch:
+                    yield batch
+
+            count = save_in_parallel(save_programs, read_batches(), workers)
+
+        failures = db_manager.failure_count
+        failed_uuids = db_manager.failures.uuids
+
+        if args.db_save_mode == "sync":
+            print(f"Sync: {db_manager.sync_stats}")
+
+            # check_full_catalogue made sure seen_uuids is the whole catalogue
+            if args.db_sync_delete:
+                deleted = db_manager.soft_delete_missing(seen_uuids)
+                print(f"Soft-deleted {deleted} programs that were not loaded.")
+
+    # only now may an incremental load treat these programs as unchanged
+    confirm_crawled([uuid for uuid in saved_uuids if uuid not in failed_uuids])
+
+    # every save mode is idempotent, so an interrupted save is simply rerun
+    checkpoint.finish()
+    metrics.add_items("save", count)
+    print(f"Total {count} programs are saved to DB ({failures} failed).")
+    if missing:
+        print(f"[!] Skipped {missing} programs without an embedding.")
+    print()
+
+
+def open_snapshots(stack: ExitStack, enabled: bool, *paths: Path):
+    if not enabled:
+        return ()
+    return tuple(
+        stack.enter_context(path.open("w", encoding="utf-8")) for path in paths
+    )
+
+
+def do_stream(args, manifest: RunManifest):
+    """Runs load, trim, vectorize and save concurrently in one process.
+
+    Programs flow between the stages through bounded queues instead of the
+    JSONL files, so a slow stage throttles the ones before it. With
+    ``--stream-snapshots`` each stage still writes its usual JSONL output.
+    """
+    print("[*] Start streaming pipeline...")
+
+    # the stages bypass the files, so stage-by-stage progress no longer applies
+    manifest.begin("load")
+
+    pipeline = StreamPipeline(queue_size=args.stream_queue_size)
+    raw_programs = pipeline.channel()
+    trimmed_programs = pipeline.channel()
+    vectorized_programs = pipeline.channel()
+    counts = {"loaded": 0, "trimmed": 0, "vectorized": 0, "saved": 0, "failed": 0}
+
+    def load_stage():
+        # sqlite connections stay on the thread that opened them
+        with metrics.stage("load"), CrawlIndex(
+            crawl_index_path
+        ) as crawl_index, ExitStack() as stack:
+            files = open_snapshots(stack, args.stream_snapshots, raw_path, raw_path_ts)
+
+            def emit(program):
+                write_jsonl(files, program)
+                raw_programs.put(program)
+
+            loaders = create_loaders(args, crawl_index)
+            counts["loaded"] = asyncio.run(
+                load_programs(loaders, crawl_index, args.load_incremental, emit)
+            )
+            metrics.add_items("load", counts["loaded"])
+
+    def trim_stage():
+        trim_cache = open_trim_cache(args)
+        runner = create_trim_runner(args, trim_cache)
+
+        try:
+            with metrics.stage("trim"), ExitStack() as stack:
+                files = open_snapshots(
+                    stack, args.stream_snapshots, trimmed_path, trimmed_path_ts
+                )
+
+                for _, result in runner.run((None, raw) for raw in raw_programs):
+                    if result["is_valid"]:
+                        program = result["trimmed_program"]
+                        write_jsonl(files, program)
+                        trimmed_programs.put(program)
+                        counts["trimmed"] += 1
+                        metrics.add_items("trim", 1)
+        finally:
+            if trim_cache is not None:
+                trim_cache.close()
+
+    def vectorize_stage():
+        embedding_store = open_embedding_store(args)
+        vectorizer = create_vectorizer(args, embedding_store)
+
+        with metrics.stage("vectorize"), ExitStack() as stack:
+            stack.callback(vectorizer.close)
+            if embedding_store is not None:
+                stack.callback(embedding_store.close)
+
+            def open_output(path, appender):
+                out = appender(path)
+                stack.callback(out.close)
+                return out
+
+            writer = None
+            if args.stream_snapshots:
+                writer = create_matrix_writer(args, vectorizer, open_output)
+
+            for batch in batched(trimmed_programs, args.vectorize_window):
+                vector_batch = vectorizer.run(batch)
+
+                for program, vector in zip(batch, vector_batch):
+                    if writer is not None:
+                        writer.write(program, vector)
+                    program["embedding"] = Vector(vector)
+                    program["embedding_hash"] = embedding_hash(
+                        program, vectorizer.model_id
+                    )
+                    vectorized_programs.put(program)
+
+                counts["vectorized"] += len(vector_batch)
+                metrics.add_items("vectorize", len(vector_batch))
+
+            if embedding_store is not None:
+                print(f"Embedding store: {embedding_store.stats()}")
+
+    def save_stage():
+        saved_uuids = []
+
+        def programs_to_save():
+            for program in vectorized_programs:
+                saved_uuids.append(program["uuid"])
+                yield program
+
+        with metrics.stage("save"), create_db_manager(args) as db_manager:
+            counts["saved"] = save_in_parallel(
+                select_save_programs(args, db_manager),
+                batched(programs_to_save(), args.db_commit_batch_size),
+                save_workers(args),
+            )
+            counts["failed"] = db_manager.failure_count
+            metrics.add_items("save", counts["saved"])
+
+            failed_uuids = db_manager.failures.uuids
+            confirm_crawled([uuid for uuid in saved_uuids if uuid not in failed_uuids])
+
+    pipeline.stage("load", load_stage, output=raw_programs)
+    pipeline.stage("trim", trim_stage, output=trimmed_programs)
+    pipeline.stage("vectorize", vectorize_stage, output=vectorized_programs)
+    pipeline.stage("save", save_stage)
+    pipeline.run()
+
+    print(
+        f"Total {counts['loaded']} loaded, {counts['trimmed']} trimmed, "
+        f"{counts['vectorized']} vectorized, {counts['saved']} saved to DB "
+        f"({counts['failed']} failed).\n"
+    )
+
+
+def do_index(args):
+    print("[*] Start building ANN index...")
+
+    matrix = EmbeddingMatrix(embedding_path)
+    vectors = np.asarray(matrix.vectors, dtype=np.float32)
+    uuids = [entry["uuid"] for entry in matrix.index]
+
+    index = IVFIndex.build(
+        vectors,
+        uuids,
+        n_lists=args.index_lists,
+        iterations=args.index_iterations,
+    )
+    report = recall_report(index, vectors, k=args.index_k, queries=args.index_queries)
+    index.save(ann_index_path, meta={"model": matrix.model, "recall": report})
+
+    print(f"Indexed {len(index)} programs into {index.n_lists} lists.")
+    for key, value in report.items():
+        print(f"{key}: {value}")
+    print()
+
+
+def do_parity(args):
+    print(f"[*] Checking {args.vectorize_backend} backend against fp32 torch...")
+
+    report = check_parity(
+        "BAAI/bge-m3",
+        backend=args.vectorize_backend,
+        onnx_file=args.vectorize_onnx_file,
+    )
+
+    for key, value in report.items():
+        print(f"{key}: {value}")
+
+
+def use_run_ts(run_ts: str):
+    """Points the timestamped outputs at those of the run being resumed."""
+    global raw_path_ts, trimmed_path_ts, embedding_path_ts, save_failure_path
+
+    raw_path_ts = data_dir / f"raw_programs_{run_ts}.jsonl"
+    trimmed_path_ts = data_dir / f"trimmed_programs_{run_ts}.jsonl"
+    embedding_path_ts = data_dir / f"embeddings_{run_ts}"
+    save_failure_path = data_dir / f"save_failures_{run_ts}.jsonl"
 
-            if batch:
-                count += db_manager.save_programs(batch)
-                batch = []
 
-    print(f"Total {count} programs are saved to DB.\n")
+def check_args(parser, args):
+    if args.db_sync_delete:
+        if args.db_save_mode != "sync":
+            parser.error("--db-sync-delete requires --db-save-mode sync")
+        if args.mode != "all":
+            parser.error("--db-sync-delete only runs with mode all")
+        if args.load_incremental:
+            parser.error("--db-sync-delete cannot be used with --load-incremental")
+        if args.resume:
+            parser.error("--db-sync-delete cannot be used with --resume")
 
 
 def main():
     parser = create_parser()
     args = parser.parse_args()
+    check_args(parser, args)
 
     mode = args.mode
 
-    if mode == "load":
-        do_load(args)
-    elif mode == "trim":
-        do_trim(args)
-    elif mode == "vectorize":
-        do_vectorize(args)
-    elif mode == "save":
-        do_save(args)
-    elif mode == "all":
-        do_load(args)
-        do_trim(args)
-        do_vectorize(args)
-        do_save(args)
+    if mode == "parity":
+        do_parity(args)
+        return
+
+    if mode == "index":
+        do_index(args)
+        return
+
+    manifest = RunManifest(run_manifest_path, ts, resume=args.resume)
+    if manifest.ts != ts:
+        use_run_ts(manifest.ts)
+
+    stages = {
+        "load": do_load,
+        "trim": do_trim,
+        "vectorize": do_vectorize,
+        "save": do_save,
+    }
+
+    # a failed run still reports how far it got and where the time went
+    try:
+        if mode == "stream":
+            do_stream(args, manifest)
+            return
+
+        for stage in stages if mode == "all" else [mode]:
+            if args.resume and manifest.is_done(stage):
+                print(f"[*] Skipping {stage}, already finished in run {manifest.ts}.\n")
+                continue
+            stages[stage](args, manifest)
+    finally:
+        metrics.write(metrics_path)
+        print(f"Metrics written to {metrics_path}.json and {metrics_path}.prom")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,2 @@
+from .checkpoint import Appender, JsonlAppender, RunManifest
+from .stream import StreamPipeline, batched
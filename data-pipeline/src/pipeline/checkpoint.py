@@ -0,0 +1,155 @@
+import json
+import os
+
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from utils.errors import ResumeError
+
+STAGES = ("load", "trim", "vectorize", "save")
+
+
+class Appender:
+    """Output file that can be reopened at its last committed size.
+
+    Anything written after the last ``sync`` is a partial record from a
+    crashed run and is truncated away on reopen.
+    """
+
+    def __init__(self, path: Path, offset: Optional[int] = None) -> None:
+        self.path = path
+
+        if offset is None:
+            self.f = path.open("wb")
+            return
+
+        if not path.exists() or path.stat().st_size < offset:
+            raise ResumeError(f"[!] {path.name} is shorter than its checkpoint.")
+
+        self.f = path.open("r+b")
+        self.f.truncate(offset)
+        self.f.seek(offset)
+
+    def write(self, data: bytes) -> None:
+        self.f.write(data)
+
+    def sync(self) -> int:
+        self.f.flush()
+        os.fsync(self.f.fileno())
+        return self.f.tell()
+
+    def close(self) -> None:
+        self.f.close()
+
+
+class JsonlAppender(Appender):
+    def write(self, obj: Any) -> None:
+        super().write((json.dumps(obj, ensure_ascii=False) + "\n").encode("utf-8"))
+
+
+class StageCheckpoint:
+    """Progress of one stage: input offset, output sizes and record count."""
+
+    def __init__(self, manifest: "RunManifest", stage: str) -> None:
+        self.manifest = manifest
+        self.stage = stage
+        self.state = manifest.data["stages"][stage]
+        self.outputs: List[Appender] = []
+
+    @property
+    def resumed(self) -> bool:
+        return self.state["input_offset"] > 0
+
+    @property
+    def input_offset(self) -> int:
+        return self.state["input_offset"]
+
+    @property
+    def count(self) -> int:
+        return self.state["count"]
+
+    def open_output(self, path: Path, appender=JsonlAppender) -> Appender:
+        out = appender(path, self.state["outputs"].get(path.name))
+        self.outputs.append(out)
+        return out
+
+    def open_outputs(self, *paths: Path) -> List[JsonlAppender]:
+        return [self.open_output(path) for path in paths]
+
+    def check_input(self, path: Path) -> None:
+        if path.stat().st_size < self.input_offset:
+            raise ResumeError(f"[!] {path.name} is shorter than its checkpoint.")
+
+    def commit(self, input_offset: int, count: int, **info: Any) -> None:
+        """Makes everything written so far durable, then records it.
+
+        ``info`` is stored alongside, e.g. how many programs were dropped.
+        """
+        self.state["outputs"] = {out.path.name: out.sync() for out in self.outputs}
+        self.state["input_offset"] = input_offset
+        self.state["count"] = count
+        self.state.update(info)
+        self.manifest.save()
+
+    def finish(self, **info: Any) -> None:
+        for out in self.outputs:
+            out.close()
+        self.state["status"] = "done"
+        self.state.update(info)
+        self.manifest.save()
+
+
+class RunManifest:
+    """Per-stage progress of a pipeline run, stored as JSON in ``path``.
+
+    The manifest is replaced atomically, so after a crash it always
+    describes a consistent prefix of every stage's input and outputs.
+    """
+
+    def __init__(self, path: Path, ts: str, resume: bool = False) -> None:
+        self.path = path
+
+        if resume and path.exists():
+            with path.open("r", encoding="utf-8") as f:
+                self.data: Dict[str, Any] = json.load(f)
+        else:
+            self.data = {"ts": ts, "stages": {}}
+            self.save()
+
+    @property
+    def ts(self) -> str:
+        return self.data["ts"]
+
+    def stage(self, stage: str) -> Dict[str, Any]:
+        return self.data["stages"].get(stage, {})
+
+    def is_done(self, stage: str) -> bool:
+        return self.stage(stage).get("status") == "done"
+
+    def begin(self, stage: str) -> StageCheckpoint:
+        """Continues ``stage`` if it was interrupted, otherwise starts it over.
+
+        Starting a stage over invalidates the progress of every later stage,
+        since their input is about to be rewritten.
+        """
+        stages = self.data["stages"]
+        if stages.get(stage, {}).get("status") != "running":
+            for later in STAGES[STAGES.index(stage) :]:
+                stages.pop(later, None)
+            stages[stage] = {
+                "status": "running",
+                "input_offset": 0,
+                "outputs": {},
+                "count": 0,
+            }
+            self.save()
+
+        return StageCheckpoint(self, stage)
+
+    def save(self) -> None:
+        tmp_path = self.path.with_suffix(".tmp")
+        with tmp_path.open("w", encoding="utf-8") as f:
+            json.dump(self.data, f, ensure_ascii=False, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,117 @@
+import queue
+import threading
+
+from typing import Any, Callable, Iterable, Iterator, List, Optional, Tuple
+
+from utils.errors import PipelineError
+
+_DONE = object()
+_POLL_SECONDS = 0.1
+
+
+class StageAborted(Exception):
+    """Raised inside a stage when another stage has failed."""
+
+
+class Channel:
+    """Bounded queue between two stages.
+
+    ``put`` blocks while the queue is full, which is what throttles a fast
+    producer to its consumer. Both ends give up once the pipeline aborts, so
+    a failed stage never leaves its neighbours blocked forever.
+    """
+
+    def __init__(self, maxsize: int, abort: threading.Event) -> None:
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.abort = abort
+
+    def put(self, item: Any) -> None:
+        while True:
+            if self.abort.is_set():
+                raise StageAborted
+            try:
+                self.queue.put(item, timeout=_POLL_SECONDS)
+                return
+            except queue.Full:
+                continue
+
+    def close(self) -> None:
+        try:
+            self.put(_DONE)
+        except StageAborted:
+            pass
+
+    def __iter__(self) -> Iterator[Any]:
+        while True:
+            if self.abort.is_set():
+                raise StageAborted
+            try:
+                item = self.queue.get(timeout=_POLL_SECONDS)
+            except queue.Empty:
+                continue
+
+            if item is _DONE:
+                return
+            yield item
+
+
+def batched(items: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+
+    if batch:
+        yield batch
+
+
+class StreamPipeline:
+    """Runs stages on their own threads, connected by bounded channels."""
+
+    def __init__(self, queue_size: int = 256) -> None:
+        self.queue_size = queue_size
+        self.abort = threading.Event()
+        self.stages: List[Tuple[str, Callable[[], None], Optional[Channel]]] = []
+        self.errors: List[Tuple[str, BaseException]] = []
+
+    def channel(self) -> Channel:
+        return Channel(self.queue_size, self.abort)
+
+    def stage(
+        self, name: str, fn: Callable[[], None], output: Optional[Channel] = None
+    ) -> None:
+        """Adds a stage; ``output`` is closed when ``fn`` returns or fails."""
+        self.stages.append((name, fn, output))
+
+    def _run_stage(
+        self, name: str, fn: Callable[[], None], output: Optional[Channel]
+    ) -> None:
+        try:
+            fn()
+        except StageAborted:
+            pass
+        except BaseException as e:
+            self.errors.append((name, e))
+            self.abort.set()
+        finally:
+            if output is not None:
+                output.close()
+
+    def run(self) -> None:
+        threads = [
+            threading.Thread(
+                target=self._run_stage, args=stage, name=stage[0], daemon=True
+            )
+            for stage in self.stages
+        ]
+
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        if self.errors:
+            name, error = self.errors[0]
+            raise PipelineError(f"[!] Stage {name} failed.", cause=error) from error
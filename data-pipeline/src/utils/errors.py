@@ -24,3 +24,11 @@ class PipelineError(Exception):
 
 class MismatchError(PipelineError):
     """Embedding UUID does not match program UUID."""
+
+
+class ResumeError(PipelineError):
+    """Run manifest does not match the files on disk."""
+
+
+class PartialInputError(PipelineError):
+    """Stage input does not cover the full catalogue."""
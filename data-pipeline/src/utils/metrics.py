@@ -0,0 +1,240 @@
+import json
+import threading
+import time
+
+from bisect import bisect_left
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+# seconds; wide enough for both a DB round trip and a slow LLM call
+LATENCY_BUCKETS = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+    120.0,
+)
+
+Key = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+
+def _key(name: str, labels: Dict[str, Any]) -> Key:
+    return name, tuple(sorted((label, str(value)) for label, value in labels.items()))
+
+
+def _format_labels(labels: Sequence[Tuple[str, str]]) -> str:
+    if not labels:
+        return ""
+    pairs = ",".join(
+        '{}="{}"'.format(
+            label,
+            value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"),
+        )
+        for label, value in labels
+    )
+    return "{" + pairs + "}"
+
+
+class Histogram:
+    """Fixed-bucket histogram; ``counts[i]`` holds values <= ``buckets[i]``."""
+
+    def __init__(self, buckets: Sequence[float] = LATENCY_BUCKETS) -> None:
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def merge(self, other: "Histogram") -> None:
+        for i, count in enumerate(other.counts):
+            self.counts[i] += count
+        self.sum += other.sum
+        self.count += other.count
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Upper bound of the bucket holding the ``q`` quantile."""
+        if not self.count:
+            return None
+
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "mean": round(self.sum / self.count, 6) if self.count else None,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+        }
+
+
+class Metrics:
+    """Counters, latency histograms and stage wall times for one run.
+
+    Every method is safe to call from any thread. Worker processes keep
+    their own registry and hand it over with ``drain``/``merge``.
+    """
+
+    def __init__(self, namespace: str = "pipeline") -> None:
+        self.namespace = namespace
+        self.lock = threading.Lock()
+        self.counters: Dict[Key, float] = {}
+        self.histograms: Dict[Key, Histogram] = {}
+        self.stages: Dict[str, Dict[str, float]] = {}
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        key = _key(name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        key = _key(name, labels)
+        with self.lock:
+            if key not in self.histograms:
+                self.histograms[key] = Histogram()
+            self.histograms[key].observe(value)
+
+    @contextmanager
+    def timer(self, name: str, **labels):
+        """Observes the seconds spent in the block, even if it raises."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    @contextmanager
+    def stage(self, name: str):
+        """Adds the wall time of the block to stage ``name``."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self.lock:
+                stage = self.stages.setdefault(name, {"seconds": 0.0, "items": 0})
+                stage["seconds"] += elapsed
+
+    def add_items(self, stage: str, count: int) -> None:
+        with self.lock:
+            self.stages.setdefault(stage, {"seconds": 0.0, "items": 0})
+            self.stages[stage]["items"] += count
+
+    def drain(self) -> Dict[str, Any]:
+        """Returns the counters and histograms collected so far and resets them."""
+        with self.lock:
+            state = {"counters": self.counters, "histograms": self.histograms}
+            self.counters = {}
+            self.histograms = {}
+        return state
+
+    def merge(self, state: Dict[str, Any]) -> None:
+        with self.lock:
+            for key, value in state["counters"].items():
+                self.counters[key] = self.counters.get(key, 0) + value
+            for key, histogram in state["histograms"].items():
+                if key not in self.histograms:
+                    self.histograms[key] = Histogram(histogram.buckets)
+                self.histograms[key].merge(histogram)
+
+    def report(self) -> Dict[str, Any]:
+        def entries(items) -> List[Dict[str, Any]]:
+            return [
+                {"name": name, "labels": dict(labels), **value}
+                for (name, labels), value in sorted(items)
+            ]
+
+        with self.lock:
+            stages = {
+                name: {
+                    "seconds": round(stage["seconds"], 3),
+                    "items": stage["items"],
+                    "items_per_second": (
+                        round(stage["items"] / stage["seconds"], 3)
+                        if stage["seconds"]
+                        else None
+                    ),
+                }
+                for name, stage in self.stages.items()
+            }
+            counters = entries(
+                (key, {"value": value}) for key, value in self.counters.items()
+            )
+            histograms = entries(
+                (key, histogram.to_dict()) for key, histogram in self.histograms.items()
+            )
+
+        return {"stages": stages, "counters": counters, "histograms": histograms}
+
+    def to_prometheus(self) -> str:
+        """Renders the registry in the Prometheus text exposition format."""
+        lines = []
+        prefix = self.namespace
+
+        with self.lock:
+            for field in ("seconds", "items"):
+                lines.append(f"# TYPE {prefix}_stage_{field} gauge")
+                for name, stage in sorted(self.stages.items()):
+                    labels = _format_labels([("stage", name)])
+                    lines.append(f"{prefix}_stage_{field}{labels} {stage[field]}")
+
+            typed = set()
+            for (name, labels), value in sorted(self.counters.items()):
+                if name not in typed:
+                    lines.append(f"# TYPE {prefix}_{name} counter")
+                    typed.add(name)
+                lines.append(f"{prefix}_{name}{_format_labels(labels)} {value}")
+
+            for (name, labels), histogram in sorted(
+                self.histograms.items(), key=lambda item: item[0]
+            ):
+                if name not in typed:
+                    lines.append(f"# TYPE {prefix}_{name} histogram")
+                    typed.add(name)
+
+                cumulative = 0
+                bounds = [str(bound) for bound in histogram.buckets] + ["+Inf"]
+                for bound, count in zip(bounds, histogram.counts):
+                    cumulative += count
+                    bucket_labels = _format_labels(list(labels) + [("le", bound)])
+                    lines.append(f"{prefix}_{name}_bucket{bucket_labels} {cumulative}")
+                lines.append(
+                    f"{prefix}_{name}_sum{_format_labels(labels)} {histogram.sum}"
+                )
+                lines.append(
+                    f"{prefix}_{name}_count{_format_labels(labels)} {histogram.count}"
+                )
+
+        return "\n".join(lines) + "\n"
+
+    def write(self, base: Path) -> None:
+        """Writes ``<base>.json`` and ``<base>.prom``."""
+        with base.with_name(base.name + ".json").open("w", encoding="utf-8") as f:
+            json.dump(self.report(), f, ensure_ascii=False, indent=2)
+        with base.with_name(base.name + ".prom").open("w", encoding="utf-8") as f:
+            f.write(self.to_prometheus())
+
+
+# process-wide registry shared by the loaders, trim graph, vectorizer and DB
+metrics = Metrics()
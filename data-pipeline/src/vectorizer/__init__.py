@@ -1 +1,12 @@
-from .vectorizer import Vectorizer
+from .vectorizer import Vectorizer, generate_program_text
+from .backends import BACKENDS, check_parity
+from .store import EmbeddingStore
+from .matrix import (
+    DTYPES,
+    EmbeddingMatrix,
+    EmbeddingMatrixWriter,
+    matrix_paths,
+    read_matrix_meta,
+    write_matrix_meta,
+)
+from .pool import PooledVectorizer
@@ -0,0 +1,117 @@
+import json
+
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from utils.errors import MismatchError
+
+DTYPES = {"float32": "<f4", "float16": "<f2"}
+
+# copied into the index so readers can filter without loading the programs
+INDEX_FIELDS = ("category", "eligibility_region")
+
+
+def matrix_paths(base: Path) -> Tuple[Path, Path, Path]:
+    """Returns the vector, index and meta paths of the matrix at ``base``."""
+    return (
+        base.with_name(f"{base.name}.bin"),
+        base.with_name(f"{base.name}.index.jsonl"),
+        base.with_name(f"{base.name}.meta.json"),
+    )
+
+
+def read_matrix_meta(base: Path) -> Optional[Dict[str, Any]]:
+    meta_path = matrix_paths(base)[2]
+    if not meta_path.exists():
+        return None
+
+    with meta_path.open("r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def write_matrix_meta(base: Path, dim: int, dtype: str, model: str) -> None:
+    meta_path = matrix_paths(base)[2]
+    with meta_path.open("w", encoding="utf-8") as f:
+        json.dump({"dim": dim, "dtype": dtype, "model": model}, f)
+
+
+class EmbeddingMatrixWriter:
+    """Appends vectors as raw little-endian rows, plus one index line per row.
+
+    ``vector_files`` take bytes and ``index_files`` take JSON objects; each
+    pair receives identical content, like the plain and timestamped JSONL
+    outputs of the other stages.
+    """
+
+    def __init__(
+        self, vector_files: List, index_files: List, dtype: str, start_row: int = 0
+    ) -> None:
+        self.vector_files = vector_files
+        self.index_files = index_files
+        self.dtype = np.dtype(DTYPES[dtype])
+        self.row = start_row
+
+    def write(self, program: Dict[str, Any], vector) -> None:
+        data = np.asarray(vector, dtype=self.dtype).tobytes()
+        entry = {"uuid": program["uuid"], "row": self.row}
+        entry.update({field: program.get(field) for field in INDEX_FIELDS})
+
+        for f in self.vector_files:
+            f.write(data)
+        for f in self.index_files:
+            f.write(entry)
+        self.row += 1
+
+
+class EmbeddingMatrix:
+    """Read-only view of a matrix written by EmbeddingMatrixWriter.
+
+    Vectors stay on disk behind ``numpy.memmap`` and are looked up by uuid.
+    """
+
+    def __init__(self, base: Path) -> None:
+        vector_path, index_path, _ = matrix_paths(base)
+
+        meta = read_matrix_meta(base)
+        if meta is None:
+            raise FileNotFoundError(f"[!] No embedding matrix at {base}.")
+
+        self.dim = meta["dim"]
+        self.dtype = meta["dtype"]
+        self.model = meta["model"]
+
+        with index_path.open("r", encoding="utf-8") as f:
+            self.index = [json.loads(line) for line in f]
+        self.rows = {entry["uuid"]: entry["row"] for entry in self.index}
+
+        row_bytes = np.dtype(DTYPES[self.dtype]).itemsize * self.dim
+        if vector_path.stat().st_size < len(self.index) * row_bytes:
+            raise MismatchError("[!] The embedding index has more rows than vectors.")
+
+        if self.index:
+            self.vectors = np.memmap(
+                vector_path,
+                dtype=DTYPES[self.dtype],
+                mode="r",
+                shape=(len(self.index), self.dim),
+            )
+        else:
+            self.vectors = np.empty((0, self.dim), dtype=DTYPES[self.dtype])
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def __contains__(self, uuid: str) -> bool:
+        return uuid in self.rows
+
+    def __iter__(self) -> Iterator[Tuple[Dict[str, Any], np.ndarray]]:
+        for entry in self.index:
+            yield entry, self.vectors[entry["row"]]
+
+    def get(self, uuid: str) -> Optional[np.ndarray]:
+        row = self.rows.get(uuid)
+        if row is None:
+            return None
+        return np.asarray(self.vectors[row], dtype=np.float32)
@@ -0,0 +1,108 @@
+import multiprocessing
+import os
+
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import numpy.typing as NDArray
+
+from utils.metrics import metrics
+
+from .store import EmbeddingStore
+from .vectorizer import Vectorizer
+
+# each worker process holds one model; set up by _init_worker
+_worker: Optional[Vectorizer] = None
+
+
+def _init_worker(
+    backend: str,
+    onnx_file: Optional[str],
+    batch_size: int,
+    max_tokens: Optional[int],
+    threads: int,
+) -> None:
+    import torch
+
+    # workers share the cores instead of each spinning up one thread per core
+    torch.set_num_threads(threads)
+
+    global _worker
+    _worker = Vectorizer(
+        backend=backend,
+        onnx_file=onnx_file,
+        batch_size=batch_size,
+        max_tokens=max_tokens,
+    )
+
+
+def _encode(texts: List[str]) -> Tuple[NDArray, Dict[str, Any]]:
+    # the worker's metrics would die with it, so ship them with each shard
+    return _worker.encode(texts), metrics.drain()
+
+
+def _dim() -> int:
+    return _worker.dim
+
+
+class PooledVectorizer(Vectorizer):
+    """Vectorizer that shards each window across worker processes.
+
+    Every worker loads its own model and runs ``threads`` torch threads, so
+    ``workers * threads`` should not exceed the cores available.
+    """
+
+    def __init__(
+        self,
+        workers: int,
+        threads: Optional[int] = None,
+        backend: str = "torch",
+        onnx_file: Optional[str] = None,
+        store: Optional[EmbeddingStore] = None,
+        batch_size: int = 32,
+        max_tokens: Optional[int] = 8192,
+    ):
+        self.workers = workers
+        self.threads = threads or max(1, (os.cpu_count() or 1) // workers)
+        self.store = store
+        self.batch_size = batch_size
+        self.max_tokens = max_tokens
+        self.model_id = Vectorizer.model_id_for(backend, onnx_file)
+
+        # fork would copy the parent's torch thread pool state into workers
+        self.executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(backend, onnx_file, batch_size, max_tokens, self.threads),
+        )
+        self._dim = self.executor.submit(_dim).result()
+        print(f"(Vectorizer) Using {workers} workers x {self.threads} threads")
+
+    @property
+    def dim(self) -> int:
+        return self._dim
+
+    def encode(self, texts: List[str]) -> NDArray:
+        if not texts:
+            return np.empty((0, self.dim), dtype=np.float32)
+
+        # dealing texts out in length order gives every worker a similar load
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        shards = [order[k :: self.workers] for k in range(self.workers)]
+        shards = [shard for shard in shards if shard]
+
+        futures = [
+            self.executor.submit(_encode, [texts[i] for i in shard]) for shard in shards
+        ]
+
+        vectors = np.empty((len(texts), self.dim), dtype=np.float32)
+        for shard, future in zip(shards, futures):
+            vectors[shard], worker_metrics = future.result()
+            metrics.merge(worker_metrics)
+
+        return vectors
+
+    def close(self) -> None:
+        self.executor.shutdown()
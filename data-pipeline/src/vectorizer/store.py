@@ -0,0 +1,105 @@
+import hashlib
+import sqlite3
+import threading
+
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterable
+
+import numpy as np
+
+# stays well below sqlite's limit on bound parameters
+_LOOKUP_CHUNK = 500
+
+
+class EmbeddingStore:
+    """Persistent store of program embeddings.
+
+    Entries are keyed by the generated program text and the model id, so a
+    program is only re-encoded when its text changes or the model does.
+    Safe to share between threads.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS embedding_store (
+                key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                created_at TEXT NOT NULL
+            )
+            """
+        )
+        self.conn.commit()
+
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(text: str, model: str) -> str:
+        data = f"{model}\0{text}"
+        return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, np.ndarray]:
+        keys = list(dict.fromkeys(keys))
+        found = {}
+
+        with self.lock:
+            for start in range(0, len(keys), _LOOKUP_CHUNK):
+                chunk = keys[start : start + _LOOKUP_CHUNK]
+                placeholders = ", ".join("?" * len(chunk))
+                rows = self.conn.execute(
+                    "SELECT key, vector FROM embedding_store "
+                    f"WHERE key IN ({placeholders})",
+                    chunk,
+                )
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32)
+
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+
+        return found
+
+    def put_many(self, model: str, vectors: Dict[str, np.ndarray]) -> None:
+        created_at = datetime.now(timezone.utc).isoformat()
+        rows = [
+            (key, model, np.asarray(vector, dtype=np.float32).tobytes(), created_at)
+            for key, vector in vectors.items()
+        ]
+
+        with self.lock:
+            self.conn.executemany(
+                """
+                INSERT OR REPLACE INTO embedding_store (key, model, vector, created_at)
+                VALUES (?, ?, ?, ?)
+                """,
+                rows,
+            )
+            self.conn.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            (entries,) = self.conn.execute(
+                "SELECT COUNT(*) FROM embedding_store"
+            ).fetchone()
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "entries": entries,
+            }
+
+    def close(self) -> None:
+        with self.lock:
+            self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
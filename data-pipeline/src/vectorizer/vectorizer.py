@@ -1,10 +1,14 @@
 from typing import List
 
+import numpy as np
 import numpy.typing as NDArray
-from sentence_transformers import SentenceTransformer
-import torch
 
-from typing import Dict, Any
+from typing import Dict, Any, Optional
+
+from utils.metrics import metrics
+
+from .backends import load_sentence_transformer
+from .store import EmbeddingStore
 
 GENDER_MAP = {"MALE": "남성", "FEMALE": "여성"}
 
@@ -106,20 +110,112 @@ def generate_program_text(program: Dict[str, Any]) -> str:
     return " ".join(parts).strip()
 
 
-class Vectorizer:
-    def __init__(self):
-        self.device = "cuda" if torch.cuda.is_available() else "cpu"
-        print(f"(Vectorizer) Using device: {self.device}")
+MODEL_NAME = "BAAI/bge-m3"
 
-        self.model = SentenceTransformer("BAAI/bge-m3", device=self.device)
 
-    def run(self, programs: List[Dict[str, Any]]) -> NDArray:
-        texts = [generate_program_text(program) for program in programs]
+def plan_batches(
+    lengths: List[int], batch_size: int, max_tokens: Optional[int]
+) -> List[List[int]]:
+    """Groups text indices into batches of similar token length.
+
+    Every text in a batch is padded to the longest one, so a batch costs
+    ``len(batch) * max(length)`` tokens; that cost is kept under
+    ``max_tokens`` and the item count under ``batch_size``.
+    """
+    order = sorted(range(len(lengths)), key=lengths.__getitem__)
+    batches = []
+    batch = []
+
+    for i in order:
+        # sorted ascending, so the current text is the longest in the batch
+        cost = (len(batch) + 1) * lengths[i]
+        if batch and (
+            len(batch) >= batch_size or (max_tokens is not None and cost > max_tokens)
+        ):
+            batches.append(batch)
+            batch = []
+        batch.append(i)
+
+    if batch:
+        batches.append(batch)
+
+    return batches
 
-        vectors = self.model.encode(
+
+class Vectorizer:
+    def __init__(
+        self,
+        backend: str = "torch",
+        onnx_file: Optional[str] = None,
+        store: Optional[EmbeddingStore] = None,
+        batch_size: int = 32,
+        max_tokens: Optional[int] = 8192,
+    ):
+        self.model = load_sentence_transformer(MODEL_NAME, backend, onnx_file)
+        self.store = store
+        self.batch_size = batch_size
+        self.max_tokens = max_tokens
+        self.model_id = self.model_id_for(backend, onnx_file)
+        print(f"(Vectorizer) Using {backend} backend on device: {self.model.device}")
+
+    @staticmethod
+    def model_id_for(backend: str, onnx_file: Optional[str] = None) -> str:
+        # vectors from different backends differ slightly, so they are stored apart
+        return ":".join(filter(None, [MODEL_NAME, backend, onnx_file]))
+
+    @property
+    def dim(self) -> int:
+        return self.model.get_sentence_embedding_dimension()
+
+    def token_lengths(self, texts: List[str]) -> List[int]:
+        encoded = self.model.tokenizer(
             texts,
-            normalize_embeddings=True,
-            show_progress_bar=False,
+            truncation=True,
+            max_length=self.model.max_seq_length,
+            return_attention_mask=False,
+            return_token_type_ids=False,
         )
+        return [len(ids) for ids in encoded["input_ids"]]
+
+    def encode(self, texts: List[str]) -> NDArray:
+        """Encodes texts in length-bucketed batches, returned in input order."""
+        if not texts:
+            return np.empty((0, self.dim), dtype=np.float32)
+
+        lengths = self.token_lengths(texts)
+        vectors = [None] * len(texts)
+
+        for batch in plan_batches(lengths, self.batch_size, self.max_tokens):
+            with metrics.timer("encode_batch_seconds"):
+                encoded = self.model.encode(
+                    [texts[i] for i in batch],
+                    batch_size=len(batch),
+                    normalize_embeddings=True,
+                    show_progress_bar=False,
+                )
+            metrics.inc("encode_texts_total", len(batch))
+            metrics.inc("encode_tokens_total", sum(lengths[i] for i in batch))
+            for i, vector in zip(batch, encoded):
+                vectors[i] = vector
+
+        return np.stack(vectors)
+
+    def run(self, programs: List[Dict[str, Any]]) -> NDArray:
+        texts = [generate_program_text(program) for program in programs]
+
+        if self.store is None:
+            return self.encode(texts)
+
+        keys = [EmbeddingStore.key(text, self.model_id) for text in texts]
+        vectors = self.store.get_many(keys)
+
+        missing = {key: text for key, text in zip(keys, texts) if key not in vectors}
+        if missing:
+            encoded = dict(zip(missing, self.encode(list(missing.values()))))
+            self.store.put_many(self.model_id, encoded)
+            vectors.update(encoded)
+
+        return np.stack([vectors[key] for key in keys])
 
-        return vectors
+    def close(self) -> None:
+        pass
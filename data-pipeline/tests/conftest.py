@@ -0,0 +1,9 @@
+import os
+import sys
+from pathlib import Path
+
+# the pipeline runs as `python src/main.py`, so its packages are top-level
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+# graph.node builds the Gemini client at import time; tests swap in fakes
+os.environ.setdefault("GOOGLE_API_KEY", "test")
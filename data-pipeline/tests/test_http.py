@@ -0,0 +1,149 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from loader.http import AsyncFetcher, TokenBucket
+
+
+def make_fetcher(handler, **kwargs) -> AsyncFetcher:
+    options = {"rate": 1000.0, "burst": 1000, "backoff": 0.001}
+    options.update(kwargs)
+    return AsyncFetcher(transport=httpx.MockTransport(handler), **options)
+
+
+def fetch_all(fetcher: AsyncFetcher, urls):
+    async def run():
+        try:
+            return await asyncio.gather(*[fetcher.get(url) for url in urls])
+        finally:
+            await fetcher.aclose()
+
+    return asyncio.run(run())
+
+
+def test_retries_429_and_5xx_until_success():
+    statuses = iter([429, 503, 200])
+    calls = []
+
+    def handler(request):
+        calls.append(request.url)
+        return httpx.Response(next(statuses), text="ok")
+
+    [response] = fetch_all(make_fetcher(handler, max_retries=3), ["http://a.test/"])
+
+    assert response.status_code == 200
+    assert len(calls) == 3
+
+
+def test_honours_retry_after():
+    statuses = iter([429, 200])
+
+    def handler(request):
+        return httpx.Response(next(statuses), headers={"Retry-After": "1"})
+
+    start = time.monotonic()
+    [response] = fetch_all(make_fetcher(handler, max_retries=1), ["http://a.test/"])
+
+    assert response.status_code == 200
+    assert time.monotonic() - start >= 1.0
+
+
+def test_gives_up_after_max_retries():
+    calls = []
+
+    def handler(request):
+        calls.append(request.url)
+        return httpx.Response(502)
+
+    with pytest.raises(httpx.HTTPStatusError):
+        fetch_all(make_fetcher(handler, max_retries=2), ["http://a.test/"])
+
+    assert len(calls) == 3
+
+
+def test_gives_up_on_repeated_timeouts():
+    calls = []
+
+    def handler(request):
+        calls.append(request.url)
+        raise httpx.ConnectTimeout("timed out", request=request)
+
+    with pytest.raises(httpx.ConnectTimeout):
+        fetch_all(make_fetcher(handler, max_retries=2), ["http://a.test/"])
+
+    assert len(calls) == 3
+
+
+def test_does_not_retry_client_errors():
+    calls = []
+
+    def handler(request):
+        calls.append(request.url)
+        return httpx.Response(404)
+
+    with pytest.raises(httpx.HTTPStatusError):
+        fetch_all(make_fetcher(handler, max_retries=3), ["http://a.test/"])
+
+    assert len(calls) == 1
+
+
+def test_caps_requests_in_flight():
+    in_flight = 0
+    peak = 0
+
+    async def handler(request):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        return httpx.Response(200)
+
+    fetch_all(
+        make_fetcher(handler, concurrency=3),
+        [f"http://a.test/{i}" for i in range(12)],
+    )
+
+    assert peak == 3
+
+
+def test_rate_limits_each_host_separately():
+    def handler(request):
+        return httpx.Response(200)
+
+    # 20 requests/second without bursts: 6 requests to one host need >= 0.25s
+    start = time.monotonic()
+    fetch_all(
+        make_fetcher(handler, rate=20.0, burst=1, concurrency=8),
+        [f"http://a.test/{i}" for i in range(6)],
+    )
+    one_host = time.monotonic() - start
+
+    # the same 6 requests spread over 3 hosts only wait for 2 tokens each
+    start = time.monotonic()
+    fetch_all(
+        make_fetcher(handler, rate=20.0, burst=1, concurrency=8),
+        [f"http://{host}.test/{i}" for host in "abc" for i in range(2)],
+    )
+    three_hosts = time.monotonic() - start
+
+    assert one_host >= 0.25
+    assert three_hosts < one_host
+
+
+def test_token_bucket_allows_burst_then_paces():
+    async def acquire_times(bucket: TokenBucket, n: int):
+        start = time.monotonic()
+        times = []
+        for _ in range(n):
+            await bucket.acquire()
+            times.append(time.monotonic() - start)
+        return times
+
+    times = asyncio.run(acquire_times(TokenBucket(rate=10.0, burst=3), 5))
+
+    assert times[2] < 0.05
+    assert times[3] >= 0.09
+    assert times[4] >= 0.19
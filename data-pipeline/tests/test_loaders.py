@@ -0,0 +1,44 @@
+import asyncio
+
+from loader import BokjiroLoader, Subsidy24Loader
+
+
+def test_empty_listing_page_marks_the_end():
+    loader = Subsidy24Loader(max_page=10)
+    listings = {1: ["a", "b"], 2: []}
+
+    async def load_uuids(page):
+        return listings[page]
+
+    async def load_programs(uuids):
+        return [{"uuid": uuid} for uuid in uuids]
+
+    loader._load_uuids = load_uuids
+    loader._load_programs = load_programs
+
+    assert len(asyncio.run(loader.aload(1))) == 2
+    assert not loader.reached_end
+    assert asyncio.run(loader.aload(2)) == []
+    assert loader.reached_end
+
+
+def test_bokjiro_end_needs_both_listings_empty():
+    loader = BokjiroLoader(max_page=10)
+    listings = {
+        1: {"central": [], "local": ["a"]},
+        2: {"central": [], "local": []},
+    }
+
+    async def load_uuids(page, targets):
+        return listings[page]
+
+    async def load_programs(uuids, operating):
+        return [{"uuid": uuid} for uuid in uuids]
+
+    loader._load_uuids = load_uuids
+    loader._load_programs = load_programs
+
+    asyncio.run(loader.aload(1))
+    assert not loader.reached_end
+    asyncio.run(loader.aload(2))
+    assert loader.reached_end
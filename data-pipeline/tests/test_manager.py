@@ -0,0 +1,120 @@
+import json
+import os
+
+import pytest
+
+psycopg = pytest.importorskip("psycopg")
+
+from database import PostgresManager, Vector
+
+# a throwaway database; program_pending is dropped and recreated there
+DATABASE_URL = os.environ.get("TEST_DATABASE_URL")
+
+pytestmark = pytest.mark.skipif(not DATABASE_URL, reason="TEST_DATABASE_URL is not set")
+
+SCHEMA = """
+CREATE EXTENSION IF NOT EXISTS vector;
+DROP TABLE IF EXISTS program_pending;
+CREATE TABLE program_pending (
+    id BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+    uuid VARCHAR(255) NOT NULL UNIQUE,
+    category VARCHAR(10) NOT NULL,
+    title VARCHAR(255) NOT NULL,
+    details TEXT NOT NULL,
+    summary TEXT NOT NULL,
+    preview TEXT NOT NULL,
+    application_method TEXT,
+    apply_url TEXT,
+    reference_url TEXT,
+    eligibility_min_age INT,
+    eligibility_max_age INT,
+    eligibility_region TEXT,
+    eligibility_min_household INT,
+    eligibility_max_household INT,
+    eligibility_min_income INT,
+    eligibility_max_income INT,
+    eligibility_gender VARCHAR(10),
+    eligibility_marital_status VARCHAR(20),
+    eligibility_education VARCHAR(30),
+    eligibility_employment VARCHAR(20),
+    apply_start_at TIMESTAMPTZ,
+    apply_end_at TIMESTAMPTZ,
+    created_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP,
+    operating_entity VARCHAR(255) NOT NULL,
+    operating_entity_type VARCHAR(255) NOT NULL,
+    embedding vector(4) NOT NULL
+);
+"""
+
+
+def make_program(i: int, **fields):
+    program = {
+        "uuid": f"u{i}",
+        "title": f"title {i}",
+        "preview": "preview",
+        "summary": "- summary",
+        "details": "details",
+        "category": "CASH",
+        "eligibility_min_age": 60,
+        "eligibility_region": "서울",
+        "operating_entity": "보건복지부",
+        "operating_entity_type": "CENTRAL",
+        "apply_start_at": "2025-01-01T00:00:00",
+        "embedding": Vector([0.1, 0.2, 0.3, float(i)]),
+    }
+    program.update(fields)
+    return program
+
+
+@pytest.fixture
+def manager(tmp_path):
+    with psycopg.connect(DATABASE_URL, autocommit=True) as conn:
+        conn.execute(SCHEMA)
+
+    with PostgresManager(DATABASE_URL, failure_path=tmp_path / "failures.jsonl") as m:
+        yield m
+
+
+def saved_uuids():
+    with psycopg.connect(DATABASE_URL) as conn:
+        return {row[0] for row in conn.execute("SELECT uuid FROM program_pending")}
+
+
+def failed_uuids(manager):
+    manager.failures.close()
+    with manager.failures.path.open(encoding="utf-8") as f:
+        return {json.loads(line)["program"]["uuid"] for line in f}
+
+
+def test_row_save_isolates_malformed_programs(manager):
+    programs = [make_program(i) for i in range(10)]
+    del programs[3]["title"]
+    programs[6]["details"] = {"not": "a string"}
+
+    assert manager.save_programs(programs) == 8
+    assert saved_uuids() == {f"u{i}" for i in range(10)} - {"u3", "u6"}
+    assert failed_uuids(manager) == {"u3", "u6"}
+
+
+def test_bulk_save_isolates_malformed_programs(manager):
+    programs = [make_program(i) for i in range(10)]
+    del programs[2]["operating_entity"]
+    programs[5]["eligibility_min_age"] = 3.7
+
+    assert manager.save_programs_bulk(programs) == 8
+    assert saved_uuids() == {f"u{i}" for i in range(10)} - {"u2", "u5"}
+    assert failed_uuids(manager) == {"u2", "u5"}
+
+
+def test_connection_errors_are_not_bisected(manager):
+    calls = []
+
+    def save(cur, items):
+        calls.append(len(items))
+        raise psycopg.OperationalError("server closed the connection")
+
+    with manager.pool.connection() as conn:
+        with pytest.raises(psycopg.OperationalError):
+            manager._save_isolated(conn, [make_program(i) for i in range(8)], save)
+
+    assert calls == [8]
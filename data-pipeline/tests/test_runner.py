@@ -0,0 +1,184 @@
+import json
+import re
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import pytest
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from pydantic import PrivateAttr
+
+from graph.runner import AdaptiveLimiter, TrimRunner
+
+RAW_PROGRAM = re.compile(r"\*\*raw_program JSON:\*\*\n```json\n(.*)\n```")
+
+
+class ScriptedChatModel(BaseChatModel):
+    """Fake chat model that answers ``{"uuid": ...}`` for the prompted program.
+
+    The raw program scripts its own call: ``delay`` seconds of latency,
+    ``throttle`` rate-limit errors before it succeeds, and ``fail`` to raise
+    a non-rate-limit error.
+    """
+
+    _lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+    _throttled: Dict[str, int] = PrivateAttr(default_factory=dict)
+    _active: int = PrivateAttr(default=0)
+    _peak: int = PrivateAttr(default=0)
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted"
+
+    @property
+    def peak_concurrency(self) -> int:
+        return self._peak
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager=None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        raw = json.loads(RAW_PROGRAM.search(messages[-1].content).group(1))
+        uuid = raw["uuid"]
+
+        with self._lock:
+            self._active += 1
+            self._peak = max(self._peak, self._active)
+            throttled = self._throttled.get(uuid, 0)
+            if throttled < raw.get("throttle", 0):
+                self._throttled[uuid] = throttled + 1
+
+        try:
+            time.sleep(raw.get("delay", 0))
+
+            if throttled < raw.get("throttle", 0):
+                raise RuntimeError("429 RESOURCE_EXHAUSTED")
+            if raw.get("fail"):
+                raise ValueError(f"bad response for {uuid}")
+        finally:
+            with self._lock:
+                self._active -= 1
+
+        message = AIMessage(content=json.dumps({"uuid": uuid}))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+def make_runner(model: ScriptedChatModel, **kwargs) -> TrimRunner:
+    options = {"concurrency": 4, "max_retries": 3, "backoff": 0.001}
+    options.update(kwargs)
+    return TrimRunner(config={"configurable": {"llm": model}}, **options)
+
+
+def test_limiter_halves_on_throttle_and_recovers_additively():
+    limiter = AdaptiveLimiter(8)
+
+    limiter.on_throttle()
+    assert limiter.limit == 4
+    limiter.on_throttle()
+    limiter.on_throttle()
+    limiter.on_throttle()
+    assert limiter.limit == 1
+
+    # the limit grows by one after ``limit`` successes in a row
+    limiter.on_success()
+    assert limiter.limit == 2
+    limiter.on_success()
+    assert limiter.limit == 2
+    limiter.on_success()
+    assert limiter.limit == 3
+
+    for _ in range(100):
+        limiter.on_success()
+    assert limiter.limit == 8
+
+
+def test_limiter_throttle_resets_the_success_streak():
+    limiter = AdaptiveLimiter(8)
+    limiter.on_throttle()
+    limiter.on_success()
+    limiter.on_success()
+    limiter.on_success()
+
+    limiter.on_throttle()
+    assert limiter.limit == 2
+    limiter.on_success()
+    assert limiter.limit == 2
+
+
+def test_limiter_caps_active_calls():
+    limiter = AdaptiveLimiter(4)
+    limiter.on_throttle()
+    active = peak = 0
+    lock = threading.Lock()
+
+    def work():
+        nonlocal active, peak
+        with limiter:
+            with lock:
+                active += 1
+                peak = max(peak, active)
+            time.sleep(0.01)
+            with lock:
+                active -= 1
+
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert peak == 2
+
+
+def test_results_keep_input_order_under_variable_latency():
+    model = ScriptedChatModel()
+    # later programs answer first
+    items = [(i, {"uuid": f"p{i}", "delay": (12 - i) * 0.005}) for i in range(12)]
+
+    results = list(make_runner(model).run(items))
+
+    assert [tag for tag, _ in results] == list(range(12))
+    assert [result["trimmed_program"]["uuid"] for _, result in results] == [
+        f"p{i}" for i in range(12)
+    ]
+    assert all(result["is_valid"] for _, result in results)
+    assert 1 < model.peak_concurrency <= 4
+
+
+def test_failed_program_does_not_stop_the_run():
+    items = [(i, {"uuid": f"p{i}", "fail": i == 2}) for i in range(5)]
+
+    results = dict(make_runner(ScriptedChatModel()).run(items))
+
+    assert not results[2]["is_valid"]
+    assert results[2]["trimmed_program"] is None
+    assert "bad response for p2" in results[2]["error"]
+    assert [results[i]["trimmed_program"]["uuid"] for i in (0, 1, 3, 4)] == [
+        "p0",
+        "p1",
+        "p3",
+        "p4",
+    ]
+
+
+def test_retries_throttled_program_and_backs_off():
+    runner = make_runner(ScriptedChatModel(), concurrency=8)
+
+    result = runner.invoke({"uuid": "p0", "throttle": 2})
+
+    assert result["is_valid"]
+    assert result["trimmed_program"] == {"uuid": "p0"}
+    assert runner.limiter.limit == 2
+
+
+def test_gives_up_when_throttling_outlasts_retries():
+    runner = make_runner(ScriptedChatModel(), max_retries=2)
+    items = [(0, {"uuid": "p0"}), (1, {"uuid": "p1", "throttle": 5})]
+
+    with pytest.raises(RuntimeError, match="429"):
+        list(runner.run(items))
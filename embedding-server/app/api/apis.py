@@ -1,21 +1,144 @@
-from fastapi import APIRouter, Depends
+import numpy as np
+
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.responses import JSONResponse
+from starlette.concurrency import run_in_threadpool
+from app.api.encoding import (
+    BINARY_RESPONSE_DOC,
+    binary_response,
+    negotiate_binary_dtype,
+)
+from app.core.metrics import (
+    cache_lookups,
+    encode_batch_size,
+    encode_seconds,
+    input_chars,
+)
 from app.core.security import get_api_key
-from app.schemas.embedding import EmbeddingResponse, TextPayload
-from app.services.embedding import get_embedding, is_model_loaded
+from app.schemas.embedding import (
+    BatchEmbeddingResponse,
+    BatchTextPayload,
+    EmbeddingResponse,
+    SearchPayload,
+    SearchResponse,
+    TextPayload,
+)
+from app.services.embedding import (
+    batcher,
+    embedding_cache,
+    get_cached_embeddings,
+    get_model_status,
+    is_model_loaded,
+    timed_encode_texts,
+)
+from app.services.search import program_search
 
 router = APIRouter(prefix="/v1")
 
 
+def require_model():
+    if not is_model_loaded():
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"Embedding model is {get_model_status()}.",
+        )
+
+
 @router.post(
     "/embed",
     response_model=EmbeddingResponse,
+    responses=BINARY_RESPONSE_DOC,
+    dependencies=[Depends(get_api_key), Depends(require_model)],
+)
+async def create_embedding(payload: TextPayload, request: Request):
+    input_chars.observe(len(payload.text))
+    embedding = await batcher.embed(payload.text)
+
+    if dtype := negotiate_binary_dtype(request):
+        return binary_response(embedding, dtype)
+    return {"embedding": embedding.tolist()}
+
+
+@router.post(
+    "/embed/batch",
+    response_model=BatchEmbeddingResponse,
+    responses=BINARY_RESPONSE_DOC,
+    dependencies=[Depends(get_api_key), Depends(require_model)],
+)
+async def create_embeddings(payload: BatchTextPayload, request: Request):
+    texts = payload.texts
+    for text in texts:
+        input_chars.observe(len(text))
+
+    embeddings = await run_in_threadpool(get_cached_embeddings, texts)
+    missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+    cache_lookups.inc(len(texts) - len(missing), result="hit", source="batch")
+    cache_lookups.inc(len(missing), result="miss", source="batch")
+
+    # only actual model calls are recorded
+    if missing:
+        encode_batch_size.observe(len(missing), source="batch")
+        encoded, seconds = await run_in_threadpool(
+            timed_encode_texts, [texts[i] for i in missing]
+        )
+        encode_seconds.observe(seconds, source="batch")
+
+        for i, embedding in zip(missing, encoded):
+            embeddings[i] = embedding
+
+    embeddings = np.stack(embeddings)
+
+    if dtype := negotiate_binary_dtype(request):
+        return binary_response(embeddings, dtype)
+    return {"embeddings": embeddings.tolist()}
+
+
+@router.post(
+    "/search",
+    response_model=SearchResponse,
     dependencies=[Depends(get_api_key)],
 )
-async def create_embedding(payload: TextPayload):
-    embedding = get_embedding(payload.text)
-    return {"embedding": embedding}
+async def search_programs(payload: SearchPayload):
+    if not program_search.is_loaded():
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Search index is not loaded.",
+        )
+
+    if payload.text is not None:
+        require_model()
+        input_chars.observe(len(payload.text))
+        query = await batcher.embed(payload.text)
+    else:
+        query = np.asarray(payload.vector, dtype=np.float32)
+
+    try:
+        results = await run_in_threadpool(
+            program_search.search,
+            query,
+            payload.k,
+            payload.categories,
+            payload.region,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    return {"results": results}
 
 
 @router.get("/health")
 def health_check():
-    return {"status": "ok", "model_loaded": is_model_loaded()}
+    return {"status": get_model_status(), "model_loaded": is_model_loaded()}
+
+
+@router.get("/ready")
+def readiness_check():
+    status_code = (
+        status.HTTP_200_OK if is_model_loaded() else status.HTTP_503_SERVICE_UNAVAILABLE
+    )
+    return JSONResponse(status_code=status_code, content={"status": get_model_status()})
+
+
+@router.get("/cache/stats", dependencies=[Depends(get_api_key)])
+def cache_stats():
+    return embedding_cache.stats()
@@ -0,0 +1,56 @@
+from typing import Optional
+
+import numpy as np
+from fastapi import Request, Response
+
+BINARY_MEDIA_TYPE = "application/octet-stream"
+BINARY_DTYPES = {"float32": "<f4", "float16": "<f2"}
+
+BINARY_RESPONSE_DOC = {
+    200: {
+        "content": {
+            BINARY_MEDIA_TYPE: {
+                "schema": {"type": "string", "format": "binary"},
+            }
+        },
+        "description": (
+            f"JSON by default. Send 'Accept: {BINARY_MEDIA_TYPE}' for raw "
+            "little-endian float32 rows, or add ';dtype=float16' for float16. "
+            "The shape is given by the X-Embedding-Count and X-Embedding-Dim headers."
+        ),
+    }
+}
+
+
+def negotiate_binary_dtype(request: Request) -> Optional[str]:
+    """Returns the requested binary dtype, or None when JSON should be sent."""
+    for media_range in request.headers.get("accept", "").split(","):
+        media_type, *params = [part.strip() for part in media_range.split(";")]
+        if media_type.lower() != BINARY_MEDIA_TYPE:
+            continue
+
+        dtype = "float32"
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "dtype":
+                dtype = value.strip().strip('"').lower()
+
+        if dtype in BINARY_DTYPES:
+            return dtype
+
+    return None
+
+
+def binary_response(embeddings: np.ndarray, dtype: str) -> Response:
+    matrix = np.atleast_2d(embeddings)
+    count, dim = matrix.shape
+
+    return Response(
+        content=matrix.astype(BINARY_DTYPES[dtype], copy=False).tobytes(),
+        media_type=BINARY_MEDIA_TYPE,
+        headers={
+            "X-Embedding-Count": str(count),
+            "X-Embedding-Dim": str(dim),
+            "X-Embedding-Dtype": dtype,
+        },
+    )
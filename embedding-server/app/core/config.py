@@ -7,3 +7,34 @@ API_KEY = os.getenv("API_KEY")
 
 if not API_KEY:
     raise RuntimeError("API_KEY environment variable not set. Server cannot start.")
+
+# "stub" serves deterministic fake vectors without loading any weights (tests)
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "BAAI/bge-m3")
+STUB_EMBEDDING_DIM = int(os.getenv("STUB_EMBEDDING_DIM", "1024"))
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")
+EMBEDDING_ONNX_FILE = os.getenv("EMBEDDING_ONNX_FILE")
+
+MAX_BATCH_SIZE = int(os.getenv("MAX_BATCH_SIZE", "256"))
+MAX_TEXT_LENGTH = int(os.getenv("MAX_TEXT_LENGTH", "8192"))
+ENCODE_BATCH_SIZE = int(os.getenv("ENCODE_BATCH_SIZE", "32"))
+
+BATCHER_MAX_BATCH_SIZE = int(os.getenv("BATCHER_MAX_BATCH_SIZE", "32"))
+BATCHER_MAX_WAIT_MS = float(os.getenv("BATCHER_MAX_WAIT_MS", "10"))
+
+EMBEDDING_CACHE_MAX_MB = float(os.getenv("EMBEDDING_CACHE_MAX_MB", "256"))
+EMBEDDING_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR")
+EMBEDDING_CACHE_DISK_MAX_ENTRIES = int(
+    os.getenv("EMBEDDING_CACHE_DISK_MAX_ENTRIES", "200000")
+)
+
+# program search: "" disables it, "file" reads the pipeline's embedding matrix
+# (<SEARCH_MATRIX_PATH>.bin/.index.jsonl/.meta.json), "postgres" reads the
+# program table (needs psycopg installed)
+SEARCH_SOURCE = os.getenv("SEARCH_SOURCE", "")
+SEARCH_MATRIX_PATH = os.getenv("SEARCH_MATRIX_PATH")
+SEARCH_ANN_PATH = os.getenv("SEARCH_ANN_PATH")
+SEARCH_ANN_PROBE = int(os.getenv("SEARCH_ANN_PROBE", "8"))
+SEARCH_DATABASE_URL = os.getenv("SEARCH_DATABASE_URL")
+SEARCH_TABLE = os.getenv("SEARCH_TABLE", "program")
+SEARCH_REFRESH_SECONDS = float(os.getenv("SEARCH_REFRESH_SECONDS", "300"))
+SEARCH_MAX_K = int(os.getenv("SEARCH_MAX_K", "100"))
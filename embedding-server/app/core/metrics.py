@@ -0,0 +1,303 @@
+"""In-process request metrics, exposed at /metrics in the Prometheus format.
+
+Every update happens on the event loop (the middleware, the endpoints and
+the batcher task), so the counters are plain ints and floats with no locks.
+Each worker process keeps its own registry; under serve.py the registries
+are summed through a shared directory (see enable_multiprocess), so every
+scrape reports the totals of all workers whichever one answers it.
+"""
+
+import asyncio
+import json
+import os
+import time
+from bisect import bisect_left
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# seconds
+LATENCY_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+# characters per input text; MAX_TEXT_LENGTH defaults to 8192
+LENGTH_BUCKETS = (16, 32, 64, 128, 256, 512, 1024, 2048, 4096, 8192)
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _format_labels(labels: Sequence[Tuple[str, str]]) -> str:
+    if not labels:
+        return ""
+    pairs = ",".join(
+        '{}="{}"'.format(label, value.replace("\\", "\\\\").replace('"', '\\"'))
+        for label, value in labels
+    )
+    return "{" + pairs + "}"
+
+
+class Histogram:
+    """Histogram with one series per label set; bucket counts are per bucket."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, buckets: Sequence[float]) -> None:
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self.series: Dict[Labels, List] = {}
+
+    def empty_copy(self) -> "Histogram":
+        return Histogram(self.name, self.help, self.buckets)
+
+    def merge(self, series: List) -> None:
+        """Adds ``series`` as produced by ``snapshot``."""
+        for labels, (counts, total, count) in series:
+            key = tuple(tuple(pair) for pair in labels)
+            own = self.series.get(key)
+            if own is None:
+                own = self.series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            own[0] = [a + b for a, b in zip(own[0], counts)]
+            own[1] += total
+            own[2] += count
+
+    def snapshot(self) -> List:
+        return [[list(labels), value] for labels, value in self.series.items()]
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = tuple(sorted(labels.items()))
+        series = self.series.get(key)
+        if series is None:
+            # [bucket counts incl. +Inf, sum, count]
+            series = self.series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        bounds = [str(bound) for bound in self.buckets] + ["+Inf"]
+
+        for labels, (counts, total, count) in sorted(self.series.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(bounds, counts):
+                cumulative += bucket_count
+                bucket_labels = _format_labels(labels + (("le", bound),))
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {count}")
+
+        return lines
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help: str) -> None:
+        self.name = name
+        self.help = help
+        self.series: Dict[Labels, float] = {}
+
+    def empty_copy(self) -> "Counter":
+        return type(self)(self.name, self.help)
+
+    def merge(self, series: List) -> None:
+        """Adds ``series`` as produced by ``snapshot``."""
+        for labels, value in series:
+            key = tuple(tuple(pair) for pair in labels)
+            self.series[key] = self.series.get(key, 0) + value
+
+    def snapshot(self) -> List:
+        return [[list(labels), value] for labels, value in self.series.items()]
+
+    def inc(self, value: float = 1, **labels: str) -> None:
+        key = tuple(sorted(labels.items()))
+        self.series[key] = self.series.get(key, 0) + value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for labels, value in sorted(self.series.items()):
+            lines.append(f"{self.name}{_format_labels(labels)} {value}")
+        return lines
+
+
+class Gauge(Counter):
+    """A counter that may also go down; ``inc(-1)`` decrements it."""
+
+    kind = "gauge"
+
+
+request_seconds = Histogram(
+    "embedding_request_seconds",
+    "End-to-end request latency.",
+    LATENCY_BUCKETS,
+)
+requests_total = Counter(
+    "embedding_requests_total",
+    "Finished requests by route and status code.",
+)
+requests_in_flight = Gauge(
+    "embedding_requests_in_flight",
+    "Requests currently being served.",
+)
+encode_seconds = Histogram(
+    "embedding_encode_seconds",
+    "Time spent encoding one batch in the model worker thread.",
+    LATENCY_BUCKETS,
+)
+queue_seconds = Histogram(
+    "embedding_queue_seconds",
+    "Time a text waited in the batcher queue before its batch was encoded.",
+    LATENCY_BUCKETS,
+)
+encode_batch_size = Histogram(
+    "embedding_encode_batch_size",
+    "Texts per encode call.",
+    BATCH_SIZE_BUCKETS,
+)
+cache_lookups = Counter(
+    "embedding_cache_lookups_total",
+    "Embedding cache lookups by result (hit or miss).",
+)
+input_chars = Histogram(
+    "embedding_input_chars",
+    "Length of each input text in characters.",
+    LENGTH_BUCKETS,
+)
+
+REGISTRY = [
+    request_seconds,
+    requests_total,
+    requests_in_flight,
+    encode_seconds,
+    queue_seconds,
+    encode_batch_size,
+    cache_lookups,
+    input_chars,
+]
+
+
+class MultiprocessStore:
+    """Registry snapshots of pre-forked workers in one shared directory.
+
+    Each worker owns ``worker-<id>.json`` and rewrites it periodically and
+    whenever it answers a scrape; a scrape sums every worker's file. A file
+    only ever moves forward, so the totals never go backwards. A restarted
+    worker resumes its counters and histograms from its file; gauges describe
+    the dead process and start over.
+    """
+
+    def __init__(self, directory: Path, worker_id: int) -> None:
+        self.directory = Path(directory)
+        self.path = self.directory / f"worker-{worker_id}.json"
+
+    def restore(self) -> None:
+        snapshot = self._read(self.path)
+        for metric in REGISTRY:
+            if metric.kind != "gauge":
+                metric.merge(snapshot.get(metric.name, []))
+
+    def write(self) -> None:
+        snapshot = {metric.name: metric.snapshot() for metric in REGISTRY}
+        tmp_path = self.path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(snapshot))
+        os.replace(tmp_path, self.path)
+
+    def collect(self) -> List:
+        totals = [metric.empty_copy() for metric in REGISTRY]
+        for path in sorted(self.directory.glob("worker-*.json")):
+            snapshot = self._read(path)
+            for metric in totals:
+                metric.merge(snapshot.get(metric.name, []))
+        return totals
+
+    @staticmethod
+    def _read(path: Path) -> Dict:
+        try:
+            return json.loads(path.read_text())
+        except FileNotFoundError:
+            return {}
+
+
+store: Optional[MultiprocessStore] = None
+
+
+def enable_multiprocess(directory: Path, worker_id: int) -> None:
+    """Makes this worker report the totals of every worker in ``directory``."""
+    global store
+
+    store = MultiprocessStore(directory, worker_id)
+    store.restore()
+    store.write()
+
+
+def multiprocess_enabled() -> bool:
+    return store is not None
+
+
+async def write_periodically(interval: float = 5.0) -> None:
+    """Keeps this worker's share fresh for scrapes answered by the others."""
+    while True:
+        await asyncio.sleep(interval)
+        store.write()
+
+
+def render_metrics() -> str:
+    metrics = REGISTRY
+    if store is not None:
+        store.write()
+        metrics = store.collect()
+
+    lines = []
+    for metric in metrics:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+class MetricsMiddleware:
+    """ASGI middleware timing every HTTP request.
+
+    Requests are labelled with the route template (``/v1/embed``) rather than
+    the raw path, so unknown paths cannot blow up the number of series.
+    """
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        requests_in_flight.inc()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            requests_in_flight.inc(-1)
+
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "unmatched"
+            if path != "/metrics":
+                request_seconds.observe(time.perf_counter() - start, path=path)
+            requests_total.inc(path=path, status=str(status_code))
@@ -1,10 +1,46 @@
-from typing import List
-from pydantic import BaseModel
+from typing import Annotated, List, Optional
+from pydantic import BaseModel, Field, model_validator
+
+from app.core.config import MAX_BATCH_SIZE, MAX_TEXT_LENGTH, SEARCH_MAX_K
 
 
 class TextPayload(BaseModel):
     text: str
 
 
+class BatchTextPayload(BaseModel):
+    texts: List[Annotated[str, Field(max_length=MAX_TEXT_LENGTH)]] = Field(
+        min_length=1, max_length=MAX_BATCH_SIZE
+    )
+
+
 class EmbeddingResponse(BaseModel):
     embedding: List[float]
+
+
+class BatchEmbeddingResponse(BaseModel):
+    embeddings: List[List[float]]
+
+
+class SearchPayload(BaseModel):
+    text: Optional[str] = Field(default=None, max_length=MAX_TEXT_LENGTH)
+    vector: Optional[List[float]] = None
+    k: int = Field(default=10, ge=1, le=SEARCH_MAX_K)
+    categories: Optional[List[str]] = None
+    region: Optional[str] = None
+
+    @model_validator(mode="after")
+    def check_query(self):
+        if (self.text is None) == (self.vector is None):
+            raise ValueError("Provide exactly one of text or vector.")
+        return self
+
+
+class SearchResult(BaseModel):
+    id: Optional[int]
+    uuid: str
+    score: float
+
+
+class SearchResponse(BaseModel):
+    results: List[SearchResult]
@@ -0,0 +1,66 @@
+import json
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+
+class IVFIndex:
+    """Reader for the IVF index built by the data pipeline's ``index`` mode.
+
+    Vectors are stored contiguously per inverted list; a query only scans
+    the ``n_probe`` lists whose centroids score highest.
+    """
+
+    def __init__(
+        self,
+        centroids: np.ndarray,
+        offsets: np.ndarray,
+        rows: np.ndarray,
+        vectors: np.ndarray,
+        uuids: List[str],
+    ) -> None:
+        self.centroids = centroids
+        self.offsets = offsets
+        self.rows = rows
+        self.vectors = vectors
+        self.uuids = uuids
+
+    @classmethod
+    def load(cls, path: Path) -> "IVFIndex":
+        with (path / "uuids.json").open("r", encoding="utf-8") as f:
+            uuids = json.load(f)
+
+        return cls(
+            centroids=np.load(path / "centroids.npy"),
+            offsets=np.load(path / "offsets.npy"),
+            rows=np.load(path / "rows.npy"),
+            vectors=np.load(path / "vectors.npy", mmap_mode="r"),
+            uuids=uuids,
+        )
+
+    def search(
+        self,
+        query: np.ndarray,
+        k: int,
+        n_probe: int,
+        mask: Optional[np.ndarray] = None,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Returns source rows and scores of the top-k, skipping masked rows."""
+        n_probe = min(n_probe, len(self.centroids))
+        probe = np.argpartition(-(self.centroids @ query), n_probe - 1)[:n_probe]
+
+        positions = np.concatenate(
+            [np.arange(self.offsets[i], self.offsets[i + 1]) for i in probe]
+        )
+        if mask is not None:
+            positions = positions[mask[self.rows[positions]]]
+        if len(positions) == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        scores = self.vectors[positions] @ query
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+
+        return self.rows[positions[top]], scores[top]
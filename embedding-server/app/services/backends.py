@@ -0,0 +1,105 @@
+"""Inference backends for bge-m3 and a parity check against fp32 torch.
+
+The data pipeline is deployed separately and keeps its own copy in
+data-pipeline/src/vectorizer/backends.py. Change both together so the
+pipeline and the server always run the model the same way.
+"""
+
+import logging
+import time
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+logger = logging.getLogger("uvicorn")
+
+# torch:      fp32 PyTorch (reference)
+# torch-int8: PyTorch with nn.Linear weights dynamically quantized to int8 (CPU)
+# onnx:       ONNX Runtime via sentence-transformers (needs optimum[onnxruntime]);
+#             pass onnx_file to pick e.g. a pre-quantized onnx/model_qint8_avx2.onnx
+BACKENDS = ("torch", "torch-int8", "onnx")
+
+PARITY_CORPUS = [
+    "65세 이상 저소득 어르신 기초연금 지급",
+    "치매 환자 가족을 위한 돌봄 휴가 및 상담 지원",
+    "노인 일자리 및 사회활동 지원사업 참여자 모집",
+    "무릎 인공관절 수술비 지원 대상은 60세 이상 저소득층입니다.",
+    "독거노인 응급안전안심서비스 장비 설치 및 관리",
+    "서울특별시 거주 중장년 재취업 교육 프로그램",
+    "주거 취약계층 노후 주택 집수리 지원",
+    "장기요양등급 외 어르신 대상 방문 돌봄 서비스",
+    "경로당 여가 문화 프로그램 운영 지원",
+    "국가유공자 및 유족 의료비 감면",
+    "I'm 70 years old and looking for housing support in Busan.",
+    "기초생활수급자 긴급 생계비 지원은 가구원 수와 소득 기준에 따라 달라집니다.",
+]
+
+
+def load_sentence_transformer(
+    model_name: str,
+    backend: str = "torch",
+    onnx_file: Optional[str] = None,
+):
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown inference backend {backend!r}, expected {BACKENDS}")
+
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+
+    if backend == "torch":
+        return SentenceTransformer(model_name, device=device)
+
+    if backend == "torch-int8":
+        model = SentenceTransformer(model_name, device="cpu")
+        torch.quantization.quantize_dynamic(
+            model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True
+        )
+        return model
+
+    try:
+        import optimum.onnxruntime  # noqa: F401
+    except ImportError as e:
+        raise ImportError(
+            "The onnx backend needs optimum with ONNX Runtime: "
+            "pip install 'optimum[onnxruntime]'"
+        ) from e
+
+    model_kwargs = {"file_name": onnx_file} if onnx_file else None
+    return SentenceTransformer(
+        model_name, device="cpu", backend="onnx", model_kwargs=model_kwargs
+    )
+
+
+def check_parity(
+    model_name: str,
+    backend: str,
+    onnx_file: Optional[str] = None,
+    runs: int = 3,
+) -> Dict[str, Any]:
+    """Encodes PARITY_CORPUS with fp32 torch and ``backend`` and compares them."""
+    reference = load_sentence_transformer(model_name, "torch")
+    candidate = load_sentence_transformer(model_name, backend, onnx_file)
+
+    def timed_encode(model):
+        model.encode(PARITY_CORPUS[:1])
+        start = time.perf_counter()
+        for _ in range(runs):
+            vectors = model.encode(PARITY_CORPUS, normalize_embeddings=True)
+        return vectors, (time.perf_counter() - start) / runs
+
+    expected, reference_seconds = timed_encode(reference)
+    actual, candidate_seconds = timed_encode(candidate)
+
+    cosines = np.sum(expected * actual, axis=1)
+
+    return {
+        "backend": backend,
+        "corpus_size": len(PARITY_CORPUS),
+        "cosine_mean": float(cosines.mean()),
+        "cosine_min": float(cosines.min()),
+        "reference_seconds": reference_seconds,
+        "candidate_seconds": candidate_seconds,
+        "speedup": reference_seconds / candidate_seconds,
+    }
@@ -0,0 +1,231 @@
+import hashlib
+import json
+import logging
+import threading
+import unicodedata
+
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Optional
+
+import numpy as np
+
+logger = logging.getLogger("uvicorn")
+
+
+def normalize_text(text: str) -> str:
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def text_key(text: str, namespace: str = "") -> str:
+    data = f"{namespace}\0{normalize_text(text)}"
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
+class DiskEmbeddingStore:
+    """Append-only vector file shared across restarts.
+
+    Vectors live in a fixed-capacity float32 memmap (``vectors.f32``) and
+    ``keys.txt`` holds one key per line, where line ``n`` owns row ``n``.
+    A row is written before its key is appended, so a crash never leaves a
+    key pointing at an unwritten vector. Once full, new keys are ignored.
+    """
+
+    def __init__(self, directory: Path, max_entries: int) -> None:
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+        self.meta_path = self.directory / "meta.json"
+        self.keys_path = self.directory / "keys.txt"
+        self.vectors_path = self.directory / "vectors.f32"
+
+        self.max_entries = max_entries
+        self.writable = True
+        self.dim: Optional[int] = None
+        self.vectors: Optional[np.memmap] = None
+        self.slots: Dict[str, int] = {}
+
+        if self.meta_path.exists():
+            meta = json.loads(self.meta_path.read_text())
+            self.dim = meta["dim"]
+            self.max_entries = meta["max_entries"]
+            self.vectors = np.memmap(
+                self.vectors_path,
+                dtype=np.float32,
+                mode="r+",
+                shape=(self.max_entries, self.dim),
+            )
+
+            with self.keys_path.open("r", encoding="utf-8") as f:
+                for slot, line in enumerate(f):
+                    key = line.strip()
+                    if key:
+                        self.slots[key] = slot
+
+        self.keys_file = self.keys_path.open("a", encoding="utf-8")
+
+    def _create(self, dim: int) -> None:
+        self.dim = dim
+        self.vectors = np.memmap(
+            self.vectors_path,
+            dtype=np.float32,
+            mode="w+",
+            shape=(self.max_entries, dim),
+        )
+        self.meta_path.write_text(
+            json.dumps({"dim": dim, "max_entries": self.max_entries})
+        )
+
+    def __len__(self) -> int:
+        return len(self.slots)
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        slot = self.slots.get(key)
+        if slot is None:
+            return None
+
+        return np.array(self.vectors[slot])
+
+    def put(self, key: str, vector: np.ndarray) -> None:
+        if not self.writable or key in self.slots:
+            return
+
+        if self.vectors is None:
+            self._create(vector.shape[-1])
+
+        slot = len(self.slots)
+        if slot >= self.max_entries:
+            return
+
+        self.vectors[slot] = vector
+        self.keys_file.write(key + "\n")
+        self.keys_file.flush()
+        self.slots[key] = slot
+
+    def flush(self) -> None:
+        if self.vectors is not None:
+            self.vectors.flush()
+        self.keys_file.flush()
+
+    def close(self) -> None:
+        self.flush()
+        self.keys_file.close()
+
+
+class EmbeddingCache:
+    """LRU cache of embeddings keyed by a hash of the normalized text.
+
+    ``namespace`` (the model name) is part of the key so vectors from a
+    different model are never served from a shared disk tier.
+
+    The in-memory tier is bounded by ``max_bytes`` of vector data. When a
+    disk directory is given, every computed vector is also persisted there
+    and memory misses fall back to it.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int,
+        disk_dir: Optional[Path] = None,
+        disk_max_entries: int = 0,
+        namespace: str = "",
+    ) -> None:
+        self.namespace = namespace
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.entries: "OrderedDict[str, np.ndarray]" = OrderedDict()
+
+        self.disk = None
+        if disk_dir:
+            self.disk = DiskEmbeddingStore(disk_dir, disk_max_entries)
+            logger.info(f"Embedding disk cache opened with {len(self.disk)} entries.")
+
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def _remember(self, key: str, vector: np.ndarray) -> None:
+        if vector.nbytes > self.max_bytes:
+            return
+
+        self.entries[key] = vector
+        self.current_bytes += vector.nbytes
+
+        while self.current_bytes > self.max_bytes:
+            _, evicted = self.entries.popitem(last=False)
+            self.current_bytes -= evicted.nbytes
+
+    def get(self, text: str) -> Optional[np.ndarray]:
+        key = text_key(text, self.namespace)
+
+        with self.lock:
+            vector = self.entries.get(key)
+            if vector is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return vector
+
+            if self.disk is not None:
+                vector = self.disk.get(key)
+                if vector is not None:
+                    self._remember(key, vector)
+                    self.disk_hits += 1
+                    return vector
+
+            self.misses += 1
+            return None
+
+    def put(self, text: str, vector: np.ndarray) -> None:
+        key = text_key(text, self.namespace)
+        vector = np.asarray(vector, dtype=np.float32)
+
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+            else:
+                self._remember(key, vector)
+
+            if self.disk is not None:
+                self.disk.put(key, vector)
+
+    def reopen_disk(self) -> None:
+        """Re-reads the disk tier from its files.
+
+        A process forked from a parent that opened the tier only sees the
+        entries that existed at fork time; appending from that stale state
+        would overwrite rows other processes wrote since.
+        """
+        with self.lock:
+            if self.disk is not None:
+                writable = self.disk.writable
+                self.disk.close()
+                self.disk = DiskEmbeddingStore(
+                    self.disk.directory, self.disk.max_entries
+                )
+                self.disk.writable = writable
+
+    def disable_disk_writes(self) -> None:
+        """Keeps reading the disk tier but stops appending to it."""
+        with self.lock:
+            if self.disk is not None:
+                self.disk.writable = False
+
+    def stats(self) -> Dict[str, float]:
+        with self.lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_ratio": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+                "entries": len(self.entries),
+                "bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+                "disk_entries": len(self.disk) if self.disk is not None else 0,
+            }
+
+    def flush(self) -> None:
+        with self.lock:
+            if self.disk is not None:
+                self.disk.flush()
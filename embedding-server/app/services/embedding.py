@@ -1,27 +1,233 @@
-from typing import List
-from sentence_transformers import SentenceTransformer
+from typing import List, Optional, Tuple
 
+import asyncio
 import logging
-import torch
+import time
+import numpy as np
+
+from app.core.config import (
+    BATCHER_MAX_BATCH_SIZE,
+    BATCHER_MAX_WAIT_MS,
+    EMBEDDING_BACKEND,
+    EMBEDDING_CACHE_DIR,
+    EMBEDDING_CACHE_DISK_MAX_ENTRIES,
+    EMBEDDING_CACHE_MAX_MB,
+    EMBEDDING_MODEL,
+    EMBEDDING_ONNX_FILE,
+    ENCODE_BATCH_SIZE,
+    STUB_EMBEDDING_DIM,
+)
+from app.core.metrics import (
+    cache_lookups,
+    encode_batch_size,
+    encode_seconds,
+    queue_seconds,
+)
+from app.services.backends import load_sentence_transformer
+from app.services.cache import EmbeddingCache
+from app.services.stub import StubModel
+
+MODEL_LOADING = "loading"
+MODEL_READY = "ready"
+MODEL_FAILED = "failed"
 
-device = "cuda" if torch.cuda.is_available() else "cpu"
 logger = logging.getLogger("uvicorn")
 
-try:
-    model = SentenceTransformer("BAAI/bge-m3", device=device)
-    logger.info("Embedding model loaded successfully.")
-except Exception as e:
-    logger.error(f"Error loading embedding model: {e}")
-    model = None
+model = None
+model_status = MODEL_LOADING
+
+embedding_cache = EmbeddingCache(
+    max_bytes=int(EMBEDDING_CACHE_MAX_MB * 1024 * 1024),
+    disk_dir=EMBEDDING_CACHE_DIR,
+    disk_max_entries=EMBEDDING_CACHE_DISK_MAX_ENTRIES,
+    namespace=f"{EMBEDDING_MODEL}:{EMBEDDING_BACKEND}",
+)
+
+
+def load_model() -> None:
+    """Loads and warms up the model. Blocking; run it off the event loop."""
+    global model, model_status
+
+    model_status = MODEL_LOADING
 
+    try:
+        if EMBEDDING_MODEL == "stub":
+            loaded = StubModel(dim=STUB_EMBEDDING_DIM)
+        else:
+            loaded = load_sentence_transformer(
+                EMBEDDING_MODEL, EMBEDDING_BACKEND, EMBEDDING_ONNX_FILE
+            )
 
-def get_embedding(text: str) -> List[float]:
+        # the first forward pass allocates buffers; keep it out of real requests
+        loaded.encode(["warm up"], batch_size=ENCODE_BATCH_SIZE)
+    except Exception as e:
+        logger.error(f"Error loading embedding model: {e}")
+        model_status = MODEL_FAILED
+        return
+
+    model = loaded
+    model_status = MODEL_READY
+    logger.info(
+        f"Embedding model {EMBEDDING_MODEL} ({EMBEDDING_BACKEND}) loaded successfully."
+    )
+
+
+def encode_texts(texts: List[str]) -> List[np.ndarray]:
+    """Runs the model over ``texts`` and stores the results in the cache."""
     if model is None:
         raise RuntimeError("Embedding model is not loaded.")
 
-    embedding_array = model.encode(text)
-    return embedding_array.tolist()
+    # encode each distinct text once, even if it repeats in the batch
+    unique_texts = list(dict.fromkeys(texts))
+
+    # encode() keeps the input order even though it sorts by length internally
+    embedding_array = model.encode(unique_texts, batch_size=ENCODE_BATCH_SIZE)
+
+    embeddings = {}
+    for text, embedding in zip(unique_texts, embedding_array):
+        embedding_cache.put(text, embedding)
+        embeddings[text] = embedding
+
+    return [embeddings[text] for text in texts]
+
+
+def timed_encode_texts(texts: List[str]) -> Tuple[List[np.ndarray], float]:
+    """encode_texts plus its duration, measured in the calling thread.
+
+    Timing around ``to_thread`` on the event loop would also count the wait
+    for a free worker thread.
+    """
+    start = time.perf_counter()
+    embeddings = encode_texts(texts)
+    return embeddings, time.perf_counter() - start
+
+
+def get_cached_embeddings(texts: List[str]) -> List[Optional[np.ndarray]]:
+    """Looks ``texts`` up in the cache; misses come back as None.
+
+    The disk tier may be read, so run it off the event loop.
+    """
+    return [embedding_cache.get(text) for text in texts]
 
 
 def is_model_loaded() -> bool:
-    return model is not None
+    return model_status == MODEL_READY
+
+
+def get_model_status() -> str:
+    return model_status
+
+
+class EmbeddingBatcher:
+    """Coalesces concurrent single-text requests into one encode call.
+
+    Callers enqueue a text with a future and await it. A single worker task
+    collects up to ``max_batch_size`` items, waiting at most ``max_wait_ms``
+    after the first one, and encodes the batch in a worker thread so the
+    event loop keeps serving other requests.
+    """
+
+    def __init__(
+        self,
+        max_batch_size: int = BATCHER_MAX_BATCH_SIZE,
+        max_wait_ms: float = BATCHER_MAX_WAIT_MS,
+    ) -> None:
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+
+        self.queue: Optional[asyncio.Queue] = None
+        self.worker: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self.worker is not None:
+            return
+
+        self.queue = asyncio.Queue()
+        self.worker = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self.worker is None:
+            return
+
+        self.worker.cancel()
+        try:
+            await self.worker
+        except asyncio.CancelledError:
+            pass
+
+        while not self.queue.empty():
+            _, future, _ = self.queue.get_nowait()
+            if not future.done():
+                future.set_exception(RuntimeError("Embedding batcher stopped."))
+
+        self.worker = None
+        self.queue = None
+
+    async def embed(self, text: str) -> np.ndarray:
+        if self.queue is None:
+            raise RuntimeError("Embedding batcher is not running.")
+
+        # the lookup may read the disk tier and waits on the cache lock while
+        # encode_texts writes to it, so it must not block the event loop
+        cached = await asyncio.to_thread(embedding_cache.get, text)
+        if cached is not None:
+            cache_lookups.inc(result="hit", source="batcher")
+            return cached
+        cache_lookups.inc(result="miss", source="batcher")
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        await self.queue.put((text, future, loop.time()))
+
+        return await future
+
+    async def _collect(self) -> List[Tuple[str, asyncio.Future, float]]:
+        loop = asyncio.get_running_loop()
+
+        batch = [await self.queue.get()]
+        deadline = loop.time() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+
+        # drop callers that gave up (e.g. client disconnected) while queued
+        return [item for item in batch if not item[1].done()]
+
+    async def _run(self) -> None:
+        while True:
+            batch = await self._collect()
+            if not batch:
+                continue
+
+            # every queued text already missed the cache in embed()
+            texts = [text for text, _, _ in batch]
+
+            start = asyncio.get_running_loop().time()
+            for _, _, queued_at in batch:
+                queue_seconds.observe(start - queued_at)
+            encode_batch_size.observe(len(texts), source="batcher")
+
+            try:
+                embeddings, seconds = await asyncio.to_thread(timed_encode_texts, texts)
+            except Exception as e:
+                logger.error(f"Error encoding batch of {len(texts)}: {e}")
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            encode_seconds.observe(seconds, source="batcher")
+
+            for (_, future, _), embedding in zip(batch, embeddings):
+                if not future.done():
+                    future.set_result(embedding)
+
+
+batcher = EmbeddingBatcher()
@@ -0,0 +1,25 @@
+"""Compares an inference backend against the fp32 PyTorch reference.
+
+Usage: python -m app.services.parity --backend torch-int8
+"""
+
+import argparse
+
+from app.services.backends import BACKENDS, check_parity
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--model", default="BAAI/bge-m3")
+    parser.add_argument("--backend", choices=BACKENDS, required=True)
+    parser.add_argument("--onnx-file", default=None)
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    report = check_parity(args.model, args.backend, args.onnx_file, args.runs)
+    for key, value in report.items():
+        print(f"{key}: {value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,248 @@
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import asyncio
+import json
+import logging
+import numpy as np
+
+from app.core.config import (
+    SEARCH_ANN_PATH,
+    SEARCH_ANN_PROBE,
+    SEARCH_DATABASE_URL,
+    SEARCH_MATRIX_PATH,
+    SEARCH_REFRESH_SECONDS,
+    SEARCH_SOURCE,
+    SEARCH_TABLE,
+)
+from app.services.ann import IVFIndex
+
+logger = logging.getLogger("uvicorn")
+
+# must match the data pipeline's vectorizer/matrix.py
+MATRIX_DTYPES = {"float32": "<f4", "float16": "<f2"}
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+@dataclass
+class ProgramMatrix:
+    """Immutable snapshot of program embeddings and their filter fields."""
+
+    ids: List[Optional[int]]
+    uuids: List[str]
+    categories: np.ndarray
+    regions: np.ndarray
+    vectors: np.ndarray
+    version: Any = None
+    ann: Optional[IVFIndex] = None
+
+    def __post_init__(self) -> None:
+        # few distinct regions, so filters are evaluated once per region
+        self.region_values = sorted({region or "" for region in self.regions})
+        lookup = {region: i for i, region in enumerate(self.region_values)}
+        self.region_codes = np.array(
+            [lookup[region or ""] for region in self.regions], dtype=np.int64
+        )
+
+    def region_mask(self, region: str) -> np.ndarray:
+        """Programs open to someone living in ``region``.
+
+        A program without a region is nationwide, and one for "경기" also
+        covers "경기 성남시".
+        """
+        allowed = np.array(
+            [
+                value == "" or value == region or region.startswith(f"{value} ")
+                for value in self.region_values
+            ]
+        )
+        return allowed[self.region_codes]
+
+    @property
+    def dim(self) -> int:
+        return self.vectors.shape[1]
+
+    def __len__(self) -> int:
+        return len(self.uuids)
+
+
+def load_matrix_file(base: Path, ann_path: Optional[Path] = None) -> ProgramMatrix:
+    paths = {
+        suffix: base.with_name(f"{base.name}.{suffix}")
+        for suffix in ("bin", "index.jsonl", "meta.json")
+    }
+
+    with paths["meta.json"].open("r", encoding="utf-8") as f:
+        meta = json.load(f)
+    with paths["index.jsonl"].open("r", encoding="utf-8") as f:
+        index = [json.loads(line) for line in f]
+
+    if not index:
+        raise RuntimeError(f"Matrix {base} has no programs to search.")
+
+    vectors = np.fromfile(
+        paths["bin"],
+        dtype=MATRIX_DTYPES[meta["dtype"]],
+        count=len(index) * meta["dim"],
+    ).reshape(len(index), meta["dim"])
+    vectors = _normalize(vectors.astype(np.float32))
+
+    uuids = [entry["uuid"] for entry in index]
+    matrix = ProgramMatrix(
+        ids=[None] * len(index),
+        uuids=uuids,
+        categories=np.array([entry.get("category") for entry in index], dtype=object),
+        regions=np.array(
+            [entry.get("eligibility_region") for entry in index], dtype=object
+        ),
+        vectors=vectors,
+        version=paths["index.jsonl"].stat().st_mtime_ns,
+    )
+
+    if ann_path is not None:
+        ann = IVFIndex.load(ann_path)
+        # an index built from an older matrix would map to the wrong rows
+        if ann.uuids == uuids:
+            matrix.ann = ann
+        else:
+            logger.warning(f"ANN index at {ann_path} is stale; using exact search.")
+
+    return matrix
+
+
+def load_matrix_postgres(conn_string: str, table: str) -> ProgramMatrix:
+    import psycopg
+    from psycopg import sql
+
+    # programs saved before they were vectorized have no embedding to rank
+    query = sql.SQL(
+        "SELECT id, uuid, category, eligibility_region, embedding::text FROM {} "
+        "WHERE embedding IS NOT NULL"
+    ).format(sql.Identifier(table))
+
+    with psycopg.connect(conn_string) as conn:
+        rows = conn.execute(query).fetchall()
+
+    if not rows:
+        raise RuntimeError(f"Table {table} has no programs to search.")
+
+    vectors = np.stack(
+        [np.array(row[4][1:-1].split(","), dtype=np.float32) for row in rows]
+    )
+    return ProgramMatrix(
+        ids=[row[0] for row in rows],
+        uuids=[row[1] for row in rows],
+        categories=np.array([row[2] for row in rows], dtype=object),
+        regions=np.array([row[3] for row in rows], dtype=object),
+        vectors=_normalize(vectors),
+    )
+
+
+class ProgramSearch:
+    """Top-k program search over a periodically refreshed embedding snapshot."""
+
+    def __init__(self) -> None:
+        self.matrix: Optional[ProgramMatrix] = None
+        self.refresh_task: Optional[asyncio.Task] = None
+
+    @property
+    def enabled(self) -> bool:
+        return SEARCH_SOURCE in ("file", "postgres")
+
+    def is_loaded(self) -> bool:
+        return self.matrix is not None
+
+    def load(self) -> None:
+        """Builds a new snapshot and swaps it in. Blocking."""
+        try:
+            if SEARCH_SOURCE == "file":
+                base = Path(SEARCH_MATRIX_PATH)
+                version = base.with_name(f"{base.name}.index.jsonl").stat().st_mtime_ns
+                if self.matrix is not None and self.matrix.version == version:
+                    return
+
+                ann_path = Path(SEARCH_ANN_PATH) if SEARCH_ANN_PATH else None
+                matrix = load_matrix_file(base, ann_path)
+            else:
+                matrix = load_matrix_postgres(SEARCH_DATABASE_URL, SEARCH_TABLE)
+        except Exception as e:
+            logger.error(f"Error loading search index: {e}")
+            return
+
+        # readers hold on to whichever snapshot they started with
+        self.matrix = matrix
+        logger.info(f"Search index loaded with {len(matrix)} programs.")
+
+    async def _refresh(self) -> None:
+        while True:
+            await asyncio.to_thread(self.load)
+            if SEARCH_REFRESH_SECONDS <= 0:
+                return
+            await asyncio.sleep(SEARCH_REFRESH_SECONDS)
+
+    def start(self) -> None:
+        if self.enabled:
+            self.refresh_task = asyncio.create_task(self._refresh())
+
+    async def stop(self) -> None:
+        if self.refresh_task is None:
+            return
+
+        self.refresh_task.cancel()
+        try:
+            await self.refresh_task
+        except asyncio.CancelledError:
+            pass
+        self.refresh_task = None
+
+    def search(
+        self,
+        query: np.ndarray,
+        k: int,
+        categories: Optional[List[str]] = None,
+        region: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        matrix = self.matrix
+        if matrix is None:
+            raise RuntimeError("Search index is not loaded.")
+        if len(query) != matrix.dim:
+            raise ValueError(f"Expected a {matrix.dim}-d vector, got {len(query)}.")
+
+        query = _normalize(np.asarray(query, dtype=np.float32))
+
+        mask = None
+        if categories:
+            mask = np.isin(matrix.categories, categories)
+        if region:
+            allowed = matrix.region_mask(region)
+            mask = allowed if mask is None else mask & allowed
+
+        if matrix.ann is not None:
+            rows, scores = matrix.ann.search(query, k, SEARCH_ANN_PROBE, mask)
+        else:
+            scores = matrix.vectors @ query
+            if mask is not None:
+                scores = np.where(mask, scores, -np.inf)
+
+            k = min(k, len(scores))
+            if k == 0:
+                return []
+            rows = np.argpartition(-scores, k - 1)[:k]
+            rows = rows[np.argsort(-scores[rows])]
+            scores = scores[rows]
+
+            keep = np.isfinite(scores)
+            rows, scores = rows[keep], scores[keep]
+
+        return [
+            {"id": matrix.ids[row], "uuid": matrix.uuids[row], "score": float(score)}
+            for row, score in zip(rows, scores)
+        ]
+
+
+program_search = ProgramSearch()
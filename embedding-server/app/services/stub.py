@@ -0,0 +1,29 @@
+import hashlib
+from typing import List, Union
+
+import numpy as np
+
+
+class StubModel:
+    """Stands in for SentenceTransformer when no real weights are wanted.
+
+    Each text maps to a fixed unit vector seeded by its sha256, so equal
+    texts always get equal embeddings and tests stay deterministic.
+    """
+
+    def __init__(self, dim: int) -> None:
+        self.dim = dim
+
+    def _vector(self, text: str) -> np.ndarray:
+        seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "big")
+        vector = np.random.default_rng(seed).standard_normal(self.dim)
+        return (vector / np.linalg.norm(vector)).astype(np.float32)
+
+    def encode(self, sentences: Union[str, List[str]], **kwargs) -> np.ndarray:
+        if isinstance(sentences, str):
+            return self._vector(sentences)
+
+        if not sentences:
+            return np.empty((0, self.dim), dtype=np.float32)
+
+        return np.stack([self._vector(text) for text in sentences])
@@ -0,0 +1,118 @@
+"""Load test for the embedding server, optionally across worker counts.
+
+Against a running server:
+    python bench/load_test.py --url http://localhost:8000 --requests 2000
+
+Scaling run (starts serve.py once per worker count on --port):
+    python bench/load_test.py --workers 1,2,4,8 --requests 2000
+
+Every request sends a distinct text so the embedding cache never answers.
+The API key is read from the API_KEY environment variable.
+"""
+
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import time
+import uuid
+from pathlib import Path
+
+import httpx
+import numpy as np
+
+SERVER_DIR = Path(__file__).resolve().parents[1]
+
+
+def make_text(i: int) -> str:
+    return f"{uuid.uuid4()} 65세 이상 어르신 돌봄 지원 사업 안내 {i} " * 4
+
+
+async def run_load(url: str, total: int, concurrency: int) -> dict:
+    headers = {"X-API-Key": os.environ["API_KEY"]}
+    latencies = []
+    errors = 0
+    counter = iter(range(total))
+
+    async with httpx.AsyncClient(base_url=url, headers=headers, timeout=120) as client:
+
+        async def user():
+            nonlocal errors
+            for i in counter:
+                start = time.perf_counter()
+                response = await client.post("/v1/embed", json={"text": make_text(i)})
+                latencies.append(time.perf_counter() - start)
+                if response.status_code != 200:
+                    errors += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*[user() for _ in range(concurrency)])
+        elapsed = time.perf_counter() - start
+
+    latencies_ms = np.array(latencies) * 1000
+    return {
+        "requests": total,
+        "errors": errors,
+        "seconds": round(elapsed, 2),
+        "throughput": round(total / elapsed, 1),
+        "p50_ms": round(float(np.percentile(latencies_ms, 50)), 1),
+        "p95_ms": round(float(np.percentile(latencies_ms, 95)), 1),
+    }
+
+
+def wait_until_ready(url: str, timeout: float = 600) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"{url}/v1/ready", timeout=5).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        time.sleep(1)
+    raise TimeoutError(f"{url} did not become ready in {timeout}s")
+
+
+def run_scaling(args) -> None:
+    url = f"http://127.0.0.1:{args.port}"
+
+    for workers in [int(n) for n in args.workers.split(",")]:
+        process = subprocess.Popen(
+            [
+                sys.executable,
+                "serve.py",
+                "--host",
+                "127.0.0.1",
+                "--port",
+                str(args.port),
+                "--workers",
+                str(workers),
+            ],
+            cwd=SERVER_DIR,
+        )
+        try:
+            wait_until_ready(url)
+            report = asyncio.run(run_load(url, args.requests, args.concurrency))
+            print(f"workers={workers} {report}", flush=True)
+        finally:
+            process.terminate()
+            process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--url", default=None)
+    parser.add_argument("--workers", default="1,2,4")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    args = parser.parse_args()
+
+    if args.url:
+        print(asyncio.run(run_load(args.url, args.requests, args.concurrency)))
+    else:
+        run_scaling(args)
+
+
+if __name__ == "__main__":
+    main()
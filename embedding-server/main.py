@@ -1,14 +1,69 @@
+import asyncio
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 from app.api.apis import router
+from app.core.metrics import (
+    MetricsMiddleware,
+    multiprocess_enabled,
+    render_metrics,
+    write_periodically,
+)
+from app.services.embedding import (
+    batcher,
+    embedding_cache,
+    is_model_loaded,
+    load_model,
+)
+from app.services.search import program_search
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # accept connections right away; /v1/health reports "loading" meanwhile.
+    # serve.py loads the model before forking, so workers skip this.
+    load_task = None
+    if not is_model_loaded():
+        load_task = asyncio.create_task(asyncio.to_thread(load_model))
+
+    # serve.py workers share their metrics through files kept fresh here
+    metrics_task = None
+    if multiprocess_enabled():
+        metrics_task = asyncio.create_task(write_periodically())
+
+    batcher.start()
+    program_search.start()
+    yield
+    await program_search.stop()
+    await batcher.stop()
+
+    if metrics_task is not None:
+        metrics_task.cancel()
+
+    if load_task is not None:
+        await load_task
+    embedding_cache.flush()
+
 
 app = FastAPI(
     title="Embedding API",
     description="An API to generate text embeddings, protected by an API Key.",
+    lifespan=lifespan,
 )
 
 app.include_router(router)
+app.add_middleware(MetricsMiddleware)
 
 
 @app.get("/")
 def read_root():
     return {"message": "Welcome to the Embedding API. See /docs for details."}
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    # async so rendering runs on the event loop, like every metric update
+    return PlainTextResponse(
+        render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
@@ -0,0 +1,170 @@
+"""Pre-fork launcher that serves the API from several worker processes.
+
+The model is loaded once in the parent, its tensors are moved to shared
+memory, and workers are forked afterwards so every worker maps the same
+weights instead of holding its own ~2 GB copy. The torch intra-op thread
+budget is split evenly across workers.
+
+Usage: python serve.py --workers 4 --port 8000
+"""
+
+import argparse
+import gc
+import logging
+import os
+import shutil
+import signal
+import socket
+import sys
+import tempfile
+
+logger = logging.getLogger("uvicorn")
+
+
+def create_parser():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument(
+        "--threads",
+        type=int,
+        default=os.cpu_count(),
+        help="total torch intra-op threads, split across workers",
+    )
+    return parser
+
+
+def bind_socket(host: str, port: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def share_model_memory(model) -> None:
+    try:
+        model.share_memory()
+    except AttributeError:
+        # the stub model has no tensors to share
+        pass
+    except Exception as e:
+        logger.warning(f"Could not move model to shared memory, relying on COW: {e}")
+
+
+def run_worker(
+    sock: socket.socket, worker_id: int, threads: int, metrics_dir: str
+) -> None:
+    import uvicorn
+
+    from app.core.metrics import enable_multiprocess
+    from app.services import embedding
+    from main import app
+
+    try:
+        import torch
+
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+
+    # the parent's view of the disk tier predates the appends of earlier
+    # workers, e.g. the one this process replaces after a crash
+    embedding.embedding_cache.reopen_disk()
+
+    # concurrent appends from several processes would corrupt the disk tier
+    if worker_id != 0:
+        embedding.embedding_cache.disable_disk_writes()
+
+    embedding.model.encode(["warm up"])
+
+    # scrapes land on any worker, so each one reports the sum of all of them
+    enable_multiprocess(metrics_dir, worker_id)
+
+    server = uvicorn.Server(uvicorn.Config(app, log_level="info"))
+    server.run(sockets=[sock])
+
+
+def main():
+    args = create_parser().parse_args()
+
+    os.environ["TOKENIZERS_PARALLELISM"] = "false"
+    threads_per_worker = max(1, args.threads // args.workers)
+
+    try:
+        import torch
+
+        # no OpenMP pool may exist before fork(); workers create their own
+        torch.set_num_threads(1)
+    except ImportError:
+        pass
+
+    from app.services import embedding
+
+    embedding.load_model()
+    if not embedding.is_model_loaded():
+        sys.exit("Embedding model failed to load.")
+
+    share_model_memory(embedding.model)
+
+    sock = bind_socket(args.host, args.port)
+    metrics_dir = tempfile.mkdtemp(prefix="embedding-metrics-")
+
+    # keep the refcount updates of already-allocated objects from dirtying
+    # shared pages in the children
+    gc.collect()
+    gc.freeze()
+
+    workers = {}
+
+    def spawn(worker_id: int) -> None:
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            try:
+                run_worker(sock, worker_id, threads_per_worker, metrics_dir)
+            finally:
+                os._exit(0)
+        workers[pid] = worker_id
+
+    for worker_id in range(args.workers):
+        spawn(worker_id)
+
+    logger.info(
+        f"Serving on {args.host}:{args.port} with {args.workers} workers "
+        f"x {threads_per_worker} threads."
+    )
+
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in workers:
+            os.kill(pid, signal.SIGTERM)
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    while workers:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+
+        worker_id = workers.pop(pid, None)
+        if worker_id is not None and not stopping:
+            logger.warning(f"Worker {worker_id} exited ({status}), restarting.")
+            spawn(worker_id)
+
+    embedding.embedding_cache.flush()
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+import atexit
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+# main.py and the app package live at the project root
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.services.stub import StubModel  # noqa: E402
+
+API_KEY = "test-key"
+STUB_DIM = 8
+
+# (uuid, category, eligibility_region) of the programs in the search matrix
+PROGRAMS = [
+    ("p0", "CASH", "서울"),
+    ("p1", "HEALTH", "경기"),
+    ("p2", "CASH", None),
+    ("p3", "CARE", "경기 성남시"),
+]
+
+
+def program_text(uuid: str) -> str:
+    return f"program {uuid}"
+
+
+def write_matrix(base: Path, programs, dim: int = STUB_DIM) -> None:
+    """Writes an embedding matrix in the data pipeline's on-disk format."""
+    model = StubModel(dim)
+    vectors = model.encode([program_text(uuid) for uuid, _, _ in programs])
+
+    base.with_name(f"{base.name}.bin").write_bytes(
+        np.asarray(vectors, dtype="<f4").reshape(-1, dim).tobytes()
+    )
+    base.with_name(f"{base.name}.index.jsonl").write_text(
+        "".join(
+            json.dumps(
+                {"uuid": uuid, "category": category, "eligibility_region": region},
+                ensure_ascii=False,
+            )
+            + "\n"
+            for uuid, category, region in programs
+        ),
+        encoding="utf-8",
+    )
+    base.with_name(f"{base.name}.meta.json").write_text(
+        json.dumps({"dim": dim, "dtype": "float32"})
+    )
+
+
+# app.core.config reads the environment once, on first import
+_search_dir = Path(tempfile.mkdtemp(prefix="embedding-server-tests-"))
+atexit.register(shutil.rmtree, _search_dir, True)
+write_matrix(_search_dir / "embeddings", PROGRAMS)
+
+os.environ.update(
+    API_KEY=API_KEY,
+    EMBEDDING_MODEL="stub",
+    STUB_EMBEDDING_DIM=str(STUB_DIM),
+    SEARCH_SOURCE="file",
+    SEARCH_MATRIX_PATH=str(_search_dir / "embeddings"),
+    SEARCH_REFRESH_SECONDS="0",
+)
+os.environ.pop("EMBEDDING_CACHE_DIR", None)
+
+
+@pytest.fixture(scope="session")
+def client():
+    from fastapi.testclient import TestClient
+
+    from app.services.search import program_search
+    from main import app
+
+    with TestClient(app, headers={"X-API-Key": API_KEY}) as test_client:
+        deadline = time.monotonic() + 10
+        while not (
+            test_client.get("/v1/health").json()["model_loaded"]
+            and program_search.is_loaded()
+        ):
+            assert time.monotonic() < deadline, "stub model or search did not load"
+            time.sleep(0.01)
+
+        yield test_client
+
+
+def metric_value(client, name: str, **labels: str) -> float:
+    """Reads one series from /metrics; a missing series counts as 0."""
+    wanted = {f'{label}="{value}"' for label, value in labels.items()}
+
+    for line in client.get("/metrics").text.splitlines():
+        if line.startswith("#"):
+            continue
+        series, _, value = line.rpartition(" ")
+        metric, _, label_text = series.partition("{")
+        if metric == name and wanted <= set(label_text.rstrip("}").split(",")):
+            return float(value)
+
+    return 0.0
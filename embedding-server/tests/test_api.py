@@ -0,0 +1,163 @@
+import numpy as np
+import pytest
+
+from app.services.stub import StubModel
+from conftest import API_KEY, STUB_DIM, metric_value, program_text
+
+BINARY = "application/octet-stream"
+WIRE_DTYPES = {"float32": "<f4", "float16": "<f2"}
+
+
+def stub_vectors(texts):
+    return np.asarray(StubModel(STUB_DIM).encode(texts), dtype=np.float32)
+
+
+def decode(response, dtype="float32"):
+    assert response.headers["content-type"].startswith(BINARY)
+    assert response.headers["X-Embedding-Dtype"] == dtype
+    count = int(response.headers["X-Embedding-Count"])
+    dim = int(response.headers["X-Embedding-Dim"])
+    return np.frombuffer(response.content, dtype=WIRE_DTYPES[dtype]).reshape(count, dim)
+
+
+def test_embed_returns_the_stub_vector(client):
+    response = client.post("/v1/embed", json={"text": "embed json"})
+
+    assert response.status_code == 200
+    embedding = response.json()["embedding"]
+    assert len(embedding) == STUB_DIM
+    np.testing.assert_allclose(embedding, stub_vectors(["embed json"])[0], rtol=1e-6)
+
+
+@pytest.mark.parametrize("dtype", ["float32", "float16"])
+def test_embed_binary_matches_json(client, dtype):
+    text = f"embed binary {dtype}"
+    accept = BINARY if dtype == "float32" else f"{BINARY};dtype={dtype}"
+
+    binary = client.post("/v1/embed", json={"text": text}, headers={"Accept": accept})
+    json_embedding = client.post("/v1/embed", json={"text": text}).json()["embedding"]
+
+    assert binary.status_code == 200
+    rows = decode(binary, dtype)
+    assert rows.shape == (1, STUB_DIM)
+    np.testing.assert_allclose(rows[0], json_embedding, atol=1e-3)
+
+
+def test_embed_batch_keeps_input_order(client):
+    texts = ["batch a", "batch b", "batch a", "batch c"]
+
+    response = client.post("/v1/embed/batch", json={"texts": texts})
+
+    assert response.status_code == 200
+    np.testing.assert_allclose(
+        response.json()["embeddings"], stub_vectors(texts), rtol=1e-6
+    )
+
+
+@pytest.mark.parametrize("dtype", ["float32", "float16"])
+def test_embed_batch_binary_matches_json(client, dtype):
+    texts = [f"batch binary {dtype} {i}" for i in range(3)]
+    accept = BINARY if dtype == "float32" else f"{BINARY};dtype={dtype}"
+
+    binary = client.post(
+        "/v1/embed/batch", json={"texts": texts}, headers={"Accept": accept}
+    )
+
+    assert binary.status_code == 200
+    np.testing.assert_allclose(decode(binary, dtype), stub_vectors(texts), atol=1e-3)
+
+
+def test_embed_batch_counts_cache_hits_and_misses(client):
+    texts = ["cached x", "cached y", "cached z"]
+
+    def lookups(result):
+        return metric_value(
+            client, "embedding_cache_lookups_total", result=result, source="batch"
+        )
+
+    def encodes():
+        return metric_value(client, "embedding_encode_batch_size_count", source="batch")
+
+    hits, misses, calls = lookups("hit"), lookups("miss"), encodes()
+
+    first = client.post("/v1/embed/batch", json={"texts": texts}).json()
+    assert (lookups("hit"), lookups("miss"), encodes()) == (hits, misses + 3, calls + 1)
+
+    # " cached  x" normalizes to "cached x"; only the new text reaches the model
+    second = client.post(
+        "/v1/embed/batch", json={"texts": [" cached  x", "cached y", "cached w"]}
+    ).json()
+    assert (lookups("hit"), lookups("miss"), encodes()) == (
+        hits + 2,
+        misses + 4,
+        calls + 2,
+    )
+    assert second["embeddings"][:2] == first["embeddings"][:2]
+
+
+def test_embed_serves_repeated_text_from_the_cache(client):
+    def lookups(result):
+        return metric_value(
+            client, "embedding_cache_lookups_total", result=result, source="batcher"
+        )
+
+    hits, misses = lookups("hit"), lookups("miss")
+
+    first = client.post("/v1/embed", json={"text": "cached single"}).json()
+    second = client.post("/v1/embed", json={"text": "cached single"}).json()
+
+    assert (lookups("hit"), lookups("miss")) == (hits + 1, misses + 1)
+    assert first == second
+
+
+def test_requests_need_the_api_key(client):
+    response = client.post(
+        "/v1/embed", json={"text": "no key"}, headers={"X-API-Key": "wrong"}
+    )
+
+    assert response.status_code == 401
+    assert client.get("/v1/health").status_code == 200
+
+
+def search(client, **payload):
+    response = client.post("/v1/search", json=payload)
+    assert response.status_code == 200, response.text
+    return [result["uuid"] for result in response.json()["results"]]
+
+
+def test_search_by_text_ranks_the_matching_program_first(client):
+    response = client.post("/v1/search", json={"text": program_text("p1"), "k": 2})
+
+    results = response.json()["results"]
+    assert results[0]["uuid"] == "p1"
+    assert results[0]["score"] == pytest.approx(1.0, abs=1e-5)
+    assert len(results) == 2
+
+
+def test_search_by_vector(client):
+    vector = stub_vectors([program_text("p3")])[0].tolist()
+
+    assert search(client, vector=vector, k=1) == ["p3"]
+    assert sorted(search(client, vector=vector, k=10)) == ["p0", "p1", "p2", "p3"]
+
+
+def test_search_filters_by_category_and_region(client):
+    vector = stub_vectors([program_text("p0")])[0].tolist()
+
+    assert sorted(search(client, vector=vector, categories=["CASH"])) == ["p0", "p2"]
+    # nationwide programs and those of the enclosing province also apply
+    assert sorted(search(client, vector=vector, region="경기 성남시")) == [
+        "p1",
+        "p2",
+        "p3",
+    ]
+    assert sorted(search(client, vector=vector, region="서울")) == ["p0", "p2"]
+    assert search(client, vector=vector, categories=["HEALTH"], region="서울") == []
+
+
+def test_search_rejects_bad_queries(client):
+    wrong_dim = client.post("/v1/search", json={"vector": [1.0, 0.0]})
+    both = client.post("/v1/search", json={"text": "x", "vector": [0.0] * STUB_DIM})
+
+    assert wrong_dim.status_code == 400
+    assert both.status_code == 422
@@ -0,0 +1,57 @@
+import numpy as np
+
+from app.services.cache import EmbeddingCache
+
+
+def vector(value: float, dim: int = 4) -> np.ndarray:
+    return np.full(dim, value, dtype=np.float32)
+
+
+def test_memory_tier_evicts_least_recently_used():
+    # room for two 4-d float32 vectors
+    cache = EmbeddingCache(max_bytes=32)
+    cache.put("a", vector(1))
+    cache.put("b", vector(2))
+    cache.get("a")
+    cache.put("c", vector(3))
+
+    assert cache.get("b") is None
+    np.testing.assert_array_equal(cache.get("a"), vector(1))
+    np.testing.assert_array_equal(cache.get("c"), vector(3))
+    assert cache.stats()["bytes"] == 32
+
+
+def test_keys_ignore_extra_whitespace():
+    cache = EmbeddingCache(max_bytes=1024)
+    cache.put("Hello  World", vector(1))
+
+    np.testing.assert_array_equal(cache.get(" Hello World "), vector(1))
+    assert cache.stats()["hits"] == 1
+
+
+def test_disk_tier_survives_a_restart(tmp_path):
+    cache = EmbeddingCache(max_bytes=1024, disk_dir=tmp_path, disk_max_entries=16)
+    cache.put("persisted", vector(5))
+    cache.flush()
+
+    reopened = EmbeddingCache(max_bytes=1024, disk_dir=tmp_path, disk_max_entries=16)
+
+    np.testing.assert_array_equal(reopened.get("persisted"), vector(5))
+    assert reopened.stats()["disk_hits"] == 1
+    # the disk hit is promoted to memory
+    reopened.get("persisted")
+    assert reopened.stats()["hits"] == 1
+
+
+def test_namespaces_do_not_share_disk_entries(tmp_path):
+    cache = EmbeddingCache(
+        max_bytes=1024, disk_dir=tmp_path, disk_max_entries=16, namespace="model-a"
+    )
+    cache.put("text", vector(1))
+    cache.flush()
+
+    other = EmbeddingCache(
+        max_bytes=1024, disk_dir=tmp_path, disk_max_entries=16, namespace="model-b"
+    )
+
+    assert other.get("text") is None
@@ -0,0 +1,38 @@
+import numpy as np
+import pytest
+
+from app.services.search import ProgramSearch, load_matrix_file
+from app.services.stub import StubModel
+from conftest import PROGRAMS, STUB_DIM, program_text, write_matrix
+
+
+@pytest.fixture
+def program_search(tmp_path):
+    write_matrix(tmp_path / "embeddings", PROGRAMS)
+
+    search = ProgramSearch()
+    search.matrix = load_matrix_file(tmp_path / "embeddings")
+    return search
+
+
+def query(uuid: str) -> np.ndarray:
+    return np.asarray(StubModel(STUB_DIM).encode([program_text(uuid)])[0])
+
+
+def test_results_are_sorted_by_score(program_search):
+    results = program_search.search(query("p2"), k=4)
+
+    assert results[0]["uuid"] == "p2"
+    scores = [result["score"] for result in results]
+    assert scores == sorted(scores, reverse=True)
+
+
+def test_filter_matching_nothing_returns_no_results(program_search):
+    assert program_search.search(query("p0"), k=3, categories=["NONE"]) == []
+
+
+def test_empty_matrix_is_rejected(tmp_path):
+    write_matrix(tmp_path / "embeddings", [])
+
+    with pytest.raises(RuntimeError, match="no programs"):
+        load_matrix_file(tmp_path / "embeddings")